@@ -0,0 +1,494 @@
+# benchmarks/load_simulator.py
+#
+# End-to-end load simulator. Drives the real handlers from register_all_handlers
+# through the full flow (/start -> passport photo -> confirm -> plate -> VIN ->
+# confirm -> price -> PDF) for many concurrent applicants, against local
+# stand-ins for the Telegram Bot API, Mindee (including the async job/polling
+# protocol) and OpenAI.
+#
+# Run from the repository root:
+#   python -m benchmarks.load_simulator --users 100
+#
+# Latency distributions are given as "const:S", "uniform:A:B" or
+# "lognormal:MEDIAN:SIGMA" (seconds), e.g. --openai-latency lognormal:0.8:0.4
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from io import BytesIO
+from urllib.parse import parse_qsl
+
+from aiohttp import ClientConnectionResetError, web
+from PIL import Image
+
+TOKEN = "123456:LOADTEST"
+
+# Vehicle data returned by the Mindee stand-in (a VIN with a valid check digit)
+PLATE = "AA1234BB"
+VIN = "1HGCM82633A004352"
+
+
+class Latency:
+    """A latency distribution parsed from a "kind:arg:arg" spec."""
+
+    def __init__(self, spec):
+        kind, *args = spec.split(":")
+        self.kind = kind
+        self.args = [float(arg) for arg in args]
+        if kind not in ("const", "uniform", "lognormal"):
+            raise argparse.ArgumentTypeError(f"Unknown latency distribution: {spec}")
+
+    def sample(self):
+        if self.kind == "const":
+            return self.args[0]
+        if self.kind == "uniform":
+            return random.uniform(self.args[0], self.args[1])
+        median, sigma = self.args
+        return random.lognormvariate(0, sigma) * median
+
+    async def wait(self):
+        await asyncio.sleep(self.sample())
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_photo(color, seed):
+    """Builds a JPEG "document" of one dominant color with per-user noise."""
+    noise = Image.effect_noise((640, 480), 40).convert("L")
+    base = Image.new("RGB", (1280, 960), color)
+    base.paste(Image.merge("RGB", (noise, noise, noise)), (320 + seed % 50, 240))
+    buffer = BytesIO()
+    base.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class FakeTelegram:
+    """Bot API stand-in that records every outgoing call per chat."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.files = {}                    # file_id -> bytes
+        self.calls = defaultdict(list)     # chat_id -> [(method, params)]
+        self.events = defaultdict(asyncio.Event)
+        self._message_id = 0
+
+    def routes(self, app):
+        app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{path:.*}", self.handle_file)
+
+    def _message(self, chat_id, text=None):
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Bot"},
+        }
+        if text is not None:
+            message["text"] = text
+        return message
+
+    async def handle_method(self, request):
+        await self.latency.wait()
+        method = request.match_info["method"]
+        if request.method == "POST":
+            params = dict(await request.post())
+        else:
+            # Parameterless calls (and getFile) are sent as GET with a form-encoded body
+            params = dict(parse_qsl(await request.text()))
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+
+        if method == "getFile":
+            file_id = params["file_id"]
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.files[file_id]), "file_path": f"photos/{file_id}.jpg"}
+        elif method == "answerCallbackQuery":
+            result = True
+        elif method in ("sendMessage", "editMessageText", "sendDocument"):
+            result = self._message(chat_id, params.get("text"))
+        else:
+            result = True
+
+        if chat_id is not None:
+            self.calls[chat_id].append((method, params))
+            self.events[chat_id].set()
+
+        return web.json_response({"ok": True, "result": result})
+
+    async def handle_file(self, request):
+        await self.latency.wait()
+        file_id = request.match_info["path"].split("/")[-1].rsplit(".", 1)[0]
+        return web.Response(body=self.files[file_id], content_type="image/jpeg")
+
+    async def wait_for(self, chat_id, cursor, predicate, timeout):
+        """Waits for a call matching the predicate after position ``cursor``; returns the new cursor and the call."""
+        deadline = time.monotonic() + timeout
+        while True:
+            calls = self.calls[chat_id]
+            while cursor < len(calls):
+                call = calls[cursor]
+                cursor += 1
+                if predicate(*call):
+                    return cursor, call
+            self.events[chat_id].clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait_for(self.events[chat_id].wait(), timeout=remaining)
+
+
+class FakeMindee:
+    """Mindee stand-in: synchronous passport API and async vehicle jobs with polling."""
+
+    def __init__(self, latency, job_time):
+        self.latency = latency
+        self.job_time = job_time
+        self.base_url = None
+        self.jobs = {}        # job_id -> (ready_at, prediction)
+        self.requests = defaultdict(int)
+
+    def routes(self, app):
+        app.router.add_post("/v1/products/mindee/passport/v1/predict", self.handle_passport)
+        app.router.add_post("/v1/products/Whylek/vehicle_registration/v1/predict_async", self.handle_vehicle)
+        app.router.add_get("/v1/products/Whylek/vehicle_registration/v1/documents/queue/{job_id}", self.handle_poll)
+
+    @staticmethod
+    def _field(value, confidence=0.97):
+        return {"value": value, "confidence": confidence}
+
+    async def handle_passport(self, request):
+        self.requests["passport"] += 1
+        await request.read()
+        await self.latency.wait()
+        prediction = {
+            "surname": self._field("DOE"),
+            "given_names": [self._field("JOHN")],
+            "birth_date": self._field("1990-01-01"),
+        }
+        return web.json_response({"document": {"inference": {"prediction": prediction}}}, status=201)
+
+    async def handle_vehicle(self, request):
+        self.requests["vehicle"] += 1
+        form = await request.post()
+        image = Image.open(BytesIO(form["document"].file.read())).convert("RGB").resize((1, 1))
+        red, _, blue = image.getpixel((0, 0))
+        await self.latency.wait()
+
+        # Red photos are the plate document, blue photos carry the VIN
+        if red > blue:
+            prediction = {"license_plate_number": self._field(PLATE)}
+        else:
+            prediction = {
+                "vehicle_identification_number": self._field(VIN),
+                "vehicle_make": self._field("Honda"),
+                "vehicle_model": self._field("Accord"),
+            }
+
+        job_id = f"job-{len(self.jobs) + 1}"
+        self.jobs[job_id] = (time.monotonic() + self.job_time.sample(), prediction)
+        polling_url = f"{self.base_url}/v1/products/Whylek/vehicle_registration/v1/documents/queue/{job_id}"
+        return web.json_response({"job": {"id": job_id, "status": "waiting", "polling_url": polling_url}}, status=202)
+
+    async def handle_poll(self, request):
+        self.requests["poll"] += 1
+        await self.latency.wait()
+        ready_at, prediction = self.jobs[request.match_info["job_id"]]
+        if time.monotonic() < ready_at:
+            return web.json_response({"job": {"status": "processing"}})
+        return web.json_response({"job": {"status": "completed"}, "document": {"inference": {"prediction": prediction}}})
+
+
+class FakeOpenAI:
+    """Chat Completions stand-in returning short canned replies."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = 0
+
+    def routes(self, app):
+        app.router.add_post("/v1/chat/completions", self.handle_completion)
+
+    async def handle_completion(self, request):
+        self.requests += 1
+        body = await request.json()
+        if body.get("stream"):
+            return await self.stream_completion(request, body)
+        await self.latency.wait()
+        prompt = body["messages"][-1]["content"]
+        if body.get("response_format", {}).get("type") == "json_object":
+            # Step-level requests: one reply per named prompt
+            content = json.dumps({
+                name: f"[sim {random.randint(0, 999)}] {text.strip()[:120]}"
+                for name, text in json.loads(prompt).items()
+            })
+        else:
+            content = f"[sim {random.randint(0, 999)}] {prompt.strip()[:120]}"
+        return web.json_response({
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "sim"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        })
+
+
+    async def stream_completion(self, request, body):
+        """Server-sent events: the first token after a fifth of the latency, the rest spread over the remainder."""
+        total = self.latency.sample()
+        words = f"[sim {random.randint(0, 999)}] {body['messages'][-1]['content'].strip()[:240]}".split(" ")
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(total * 0.2)
+        try:
+            for i, word in enumerate(words):
+                chunk = {
+                    "id": f"chatcmpl-{self.requests}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "sim"),
+                    "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+                }
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(total * 0.8 / len(words))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except (ConnectionResetError, ClientConnectionResetError):
+            # The bot closed the stream early, e.g. when the step budget ran out
+            pass
+        return response
+
+
+async def start_server(service):
+    """Starts an aiohttp app for a stand-in on a free local port and returns (runner, base_url)."""
+    app = web.Application(client_max_size=20 * 1024 ** 2)
+    service.routes(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+class Applicant:
+    """One simulated user walking through the whole insurance flow."""
+
+    def __init__(self, user_id, bot, telegram, latencies, step_timeout):
+        self.user_id = user_id
+        self.bot = bot
+        self.telegram = telegram
+        self.latencies = latencies
+        self.step_timeout = step_timeout
+        self.cursor = 0
+        self._update_id = user_id * 1000
+
+        telegram.files[f"passport-{user_id}"] = make_photo((200, 200, 200), user_id)
+        telegram.files[f"plate-{user_id}"] = make_photo((220, 60, 60), user_id)
+        telegram.files[f"vin-{user_id}"] = make_photo((60, 60, 220), user_id)
+
+    def _user(self):
+        return {"id": self.user_id, "is_bot": False, "first_name": f"User{self.user_id}"}
+
+    def _message(self, **fields):
+        self._update_id += 1
+        message = {
+            "message_id": self._update_id,
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"},
+            "from": self._user(),
+        }
+        message.update(fields)
+        return {"update_id": self._update_id, "message": message}
+
+    def _photo(self, file_id):
+        sizes = [(90, 68), (320, 240), (800, 600), (1280, 960)]
+        return self._message(photo=[
+            {"file_id": file_id, "file_unique_id": f"{file_id}-{w}", "width": w, "height": h}
+            for w, h in sizes
+        ])
+
+    def _callback(self, data, message_params):
+        self._update_id += 1
+        return {"update_id": self._update_id, "callback_query": {
+            "id": str(self._update_id),
+            "from": self._user(),
+            "chat_instance": str(self.user_id),
+            "data": data,
+            "message": {
+                "message_id": self._update_id,
+                "date": int(time.time()),
+                "chat": {"id": self.user_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "Bot"},
+                "text": message_params.get("text", ""),
+            },
+        }}
+
+    async def step(self, name, update, predicate):
+        """Sends an update and waits for the bot's reply matching the predicate."""
+        from telebot import types
+
+        started = time.monotonic()
+        await self.bot.process_new_updates([types.Update.de_json(json.dumps(update))])
+        self.cursor, call = await self.telegram.wait_for(self.user_id, self.cursor, predicate, self.step_timeout)
+        self.latencies[name].append(time.monotonic() - started)
+        return call
+
+    async def expect(self, name, predicate):
+        """Waits for a follow-up reply that is not triggered by a new update."""
+        started = time.monotonic()
+        self.cursor, call = await self.telegram.wait_for(self.user_id, self.cursor, predicate, self.step_timeout)
+        self.latencies[name].append(time.monotonic() - started)
+        return call
+
+    async def run(self):
+        def sent(method="sendMessage", markup=None):
+            return lambda m, params: m == method and (markup is None or markup in params.get("reply_markup", ""))
+
+        await self.step("start", self._message(text="/start", entities=[{"type": "bot_command", "offset": 0, "length": 6}]), sent())
+        await self.step("begin", self._message(text="🚗 Start"), sent())
+        _, passport = await self.step("passport_ocr", self._photo(f"passport-{self.user_id}"), sent(markup="confirm_passport_yes"))
+        await self.step("passport_confirm", self._callback("confirm_passport_yes", passport), sent("editMessageText"))
+        await self.step("plate_ocr", self._photo(f"plate-{self.user_id}"), sent())
+        _, vehicle = await self.step("vin_ocr", self._photo(f"vin-{self.user_id}"), sent(markup="confirm_vehicle_yes"))
+        _, price = await self.step("vehicle_confirm", self._callback("confirm_vehicle_yes", vehicle), sent(markup="price_agree"))
+        await self.step("policy_pdf", self._callback("price_agree", price), sent("sendDocument"))
+        await self.expect("policy_summary", sent())
+
+
+async def simulate(args):
+    telegram = FakeTelegram(args.telegram_latency)
+    mindee = FakeMindee(args.mindee_latency, args.mindee_job_time)
+    openai = FakeOpenAI(args.openai_latency)
+
+    runners = []
+    for service in (telegram, mindee, openai):
+        runner, base_url = await start_server(service)
+        runners.append(runner)
+        service.base_url = base_url
+
+    # Point the bot at the stand-ins before any project module reads its configuration
+    workdir = tempfile.mkdtemp(prefix="loadsim-")
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": TOKEN,
+        "MINDEE_API_KEY": "loadtest",
+        "MINDEE_API_URL": mindee.base_url,
+        "OPENAI_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": f"{openai.base_url}/v1",
+        "SESSION_BACKEND": "memory",
+        "OCR_CACHE_PATH": os.path.join(workdir, "ocr_cache.db"),
+        "RESPONSE_CACHE_PATH": os.path.join(workdir, "response_cache.json"),
+    })
+
+    from telebot import asyncio_helper
+    from telebot.async_telebot import AsyncTeleBot
+    from handlers import register_all_handlers
+    from utils.dispatcher import dispatcher
+    from utils.logger import setup_logging
+    from utils.rate_limiter import limit_telegram_requests, outbound
+
+    setup_logging()
+    asyncio_helper.API_URL = telegram.base_url + "/bot{0}/{1}"
+    asyncio_helper.FILE_URL = telegram.base_url + "/file/bot{0}/{1}"
+
+    bot = AsyncTeleBot(TOKEN)
+    register_all_handlers(bot)
+    dispatcher.install(bot)
+    limit_telegram_requests(outbound)
+    # Open telebot's shared HTTP session up front; concurrent first requests would each create one
+    await asyncio_helper.session_manager.get_session()
+
+    latencies = defaultdict(list)
+    applicants = [Applicant(1000 + i, bot, telegram, latencies, args.step_timeout) for i in range(args.users)]
+
+    async def run_applicant(index, applicant):
+        await asyncio.sleep(args.ramp * index / max(args.users, 1))
+        try:
+            await applicant.run()
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    print(f"Simulating {args.users} applicants...")
+    started = time.monotonic()
+    results = await asyncio.gather(*(run_applicant(i, a) for i, a in enumerate(applicants)))
+    elapsed = time.monotonic() - started
+
+    from services.mindee_client import mindee_client
+    from services.mindee_jobs import vehicle_jobs
+    from services.openai_service import close_openai_client
+    from services.pdf_service import pdf_service
+
+    await vehicle_jobs.stop()
+    await mindee_client.close()
+    await close_openai_client()
+    await bot.close_session()
+    pdf_service.shutdown()
+    for runner in runners:
+        await runner.cleanup()
+
+    from utils.metrics import metrics
+    report(args, latencies, results, elapsed, mindee, openai, metrics.totals(), metrics.queue_totals())
+
+
+def report(args, latencies, results, elapsed, mindee, openai, span_totals, queue_totals):
+    completed = sum(results)
+    print()
+    print(f"{'step':<18}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, values in latencies.items():
+        print(f"{name:<18}{len(values):>6}"
+              f"{percentile(values, 50) * 1000:>10.0f}"
+              f"{percentile(values, 95) * 1000:>10.0f}"
+              f"{percentile(values, 99) * 1000:>10.0f}")
+
+    print()
+    print(f"{'span':<20}{'step':<18}{'outcome':<12}{'n':>6}{'total s':>10}{'avg ms':>10}")
+    for name, step, outcome, count, total in span_totals:
+        if name != "handler":
+            print(f"{name:<20}{step:<18}{outcome:<12}{count:>6}{total:>10.1f}{total / count * 1000:>10.0f}")
+
+    print()
+    print(f"{'queue':<20}{'step':<18}{'priority':<12}{'n':>6}{'total s':>10}{'avg ms':>10}")
+    for service, step, priority, count, total in queue_totals:
+        print(f"{service:<20}{step:<18}{priority:<12}{count:>6}{total:>10.1f}{total / count * 1000:>10.0f}")
+
+    peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print()
+    print(f"completed flows:   {completed}/{args.users} ({args.users - completed} timed out)")
+    print(f"wall time:         {elapsed:.1f} s")
+    print(f"throughput:        {completed / elapsed:.2f} flows/s")
+    print(f"upstream calls:    mindee {dict(mindee.requests)}, openai {openai.requests}")
+    print(f"peak RSS:          {peak_self:.0f} MB (largest child process {peak_children:.0f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load simulator for the insurance bot")
+    parser.add_argument("--users", type=int, default=100, help="number of concurrent applicants")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which applicants start")
+    parser.add_argument("--step-timeout", type=float, default=120.0, help="seconds to wait for each reply")
+    parser.add_argument("--telegram-latency", type=Latency, default=Latency("lognormal:0.03:0.3"))
+    parser.add_argument("--mindee-latency", type=Latency, default=Latency("lognormal:0.5:0.4"))
+    parser.add_argument("--mindee-job-time", type=Latency, default=Latency("uniform:2:6"))
+    parser.add_argument("--openai-latency", type=Latency, default=Latency("lognormal:0.8:0.5"))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    asyncio.run(simulate(args))
+
+
+if __name__ == "__main__":
+    main()
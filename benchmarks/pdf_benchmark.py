@@ -0,0 +1,45 @@
+# benchmarks/pdf_benchmark.py
+#
+# Micro-benchmark for the in-memory PDF renderer.
+# Run from the repository root:  python -m benchmarks.pdf_benchmark [documents]
+
+import statistics
+import sys
+import time
+
+from services.policy_template import assemble_policy, render_policy_sections
+from utils.pdf_generator import render_pdf
+
+SAMPLE_USER_DATA = {
+    "passport": {"surname": "Doe", "given_names": ["John"], "birth_date": "1990-01-01"},
+    "vehicle": {"license_plate": "AA1234BB", "vin": "1HGCM82633A004352", "make": "Honda", "model": "Accord"},
+}
+
+
+def run(documents: int = 200):
+    """Renders the sample policy repeatedly and prints time and size per document."""
+
+    policy_text = assemble_policy(render_policy_sections(SAMPLE_USER_DATA))
+
+    # Warm-up render so one-time font loading is not measured
+    render_pdf(policy_text)
+
+    timings = []
+    sizes = []
+    for _ in range(documents):
+        start = time.perf_counter()
+        pdf_bytes = render_pdf(policy_text)
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(pdf_bytes))
+
+    timings.sort()
+    print(f"documents:      {documents}")
+    print(f"mean:           {statistics.mean(timings):.2f} ms/doc")
+    print(f"p50:            {timings[len(timings) // 2]:.2f} ms")
+    print(f"p95:            {timings[int(len(timings) * 0.95) - 1]:.2f} ms")
+    print(f"throughput:     {documents / (sum(timings) / 1000):.1f} docs/s")
+    print(f"size:           {statistics.mean(sizes):.0f} bytes/doc")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,43 @@
+# benchmarks/vin_benchmark.py
+#
+# Throughput benchmark for bulk VIN validation and decoding.
+# Run from the repository root:  python -m benchmarks.vin_benchmark [count]
+
+import random
+import sys
+import time
+
+from utils.vin import WMI_MAKES, check_digit, decode_vin
+
+_ALPHABET = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+
+
+def _random_vin(rng, valid):
+    """Builds a random VIN with a known WMI; invalid ones get a wrong check digit."""
+    wmi = rng.choice([wmi for wmi in WMI_MAKES if len(wmi) == 3])
+    body = wmi + "".join(rng.choice(_ALPHABET) for _ in range(14))
+    vin = body[:8] + check_digit(body) + body[9:]
+    if not valid and vin[0] in "12345L":
+        vin = vin[:8] + ("1" if vin[8] != "1" else "2") + vin[9:]
+    return vin
+
+
+def run(count=200000):
+    """Decodes a mix of valid and corrupted VINs and prints the throughput."""
+
+    rng = random.Random(42)
+    vins = [_random_vin(rng, valid=i % 4 != 0) for i in range(count)]
+
+    start = time.perf_counter()
+    valid = sum(1 for vin in vins if decode_vin(vin)["valid"])
+    elapsed = time.perf_counter() - start
+
+    print(f"vins:        {count}")
+    print(f"valid:       {valid}")
+    print(f"elapsed:     {elapsed * 1000:.1f} ms")
+    print(f"throughput:  {count / elapsed:,.0f} VINs/s")
+    print(f"per VIN:     {elapsed / count * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
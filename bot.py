@@ -1,19 +1,147 @@
 # bot.py
 
-import telebot
+import argparse
+import asyncio
+from telebot.async_telebot import AsyncTeleBot
 from handlers import register_all_handlers
+from services.openai_service import close_openai_client, warm_up_response_cache, save_response_cache, response_cache, response_flights, openai_breaker
+from services.mindee_jobs import vehicle_jobs
+from services.mindee_client import mindee_client
+from services.pdf_service import pdf_service
+from services.policy_prefetch import policy_prefetch
+from services.ocr_cache import get_ocr_cache, close_ocr_cache
+from utils.state_manager import close_sessions, preload_session, session_stats
+from utils.webhook_server import WebhookServer
+from utils.dispatcher import dispatcher
+from utils.image_preprocess import ocr_image_bytes
+from utils.rate_limiter import limit_telegram_requests, outbound
+from utils.metrics import metrics
+from utils.logger import get_logger, handle_logging_settings, setup_logging, shutdown_logging
 import config
 
-# Initialize the bot with the token from the config file
-bot = telebot.TeleBot(config.BOT_TOKEN)
+log = get_logger("Bot")
 
-# Dictionary to store user data during interactions
-bot.user_data = {}
 
-# Register all handlers (commands, messages, callbacks, etc.)
-register_all_handlers(bot)
+def create_bot():
+    """
+    Builds the bot and wires it up. Kept out of module level because PDF worker
+    processes re-import this module as __mp_main__ and must not build a bot.
+    """
+
+    # Initialize the asynchronous bot with the token from the config file
+    bot = AsyncTeleBot(config.BOT_TOKEN)
+
+    # Register all handlers (commands, messages, callbacks, etc.)
+    register_all_handlers(bot)
+
+    # Process each user's updates in order, different users in parallel,
+    # with the user's session loaded off the event loop first
+    dispatcher.install(bot, prepare=preload_session)
+
+    # Keep Bot API calls within Telegram's global and per-chat limits
+    limit_telegram_requests(outbound)
+    return bot
+
+
+def register_gauges():
+    """Exposes the queue depths and cache counters of the shared components on /metrics."""
+
+    metrics.gauge("dispatch_queue_depth", "Updates waiting in per-user queues.", lambda: dispatcher.stats()["queue_depth"])
+    metrics.gauge("dispatch_max_wait_seconds", "Longest time an update waited in its user queue.", lambda: dispatcher.stats()["max_wait"])
+    metrics.gauge("mindee_jobs_pending", "Vehicle OCR jobs waiting for a result.", lambda: vehicle_jobs.pending)
+    metrics.gauge("mindee_polls_total", "Polling requests sent for vehicle OCR jobs.", lambda: vehicle_jobs.total_polls, "counter")
+    metrics.gauge("pdf_queue_depth", "PDF renders waiting for a worker process.", lambda: pdf_service.queue_depth)
+    metrics.gauge("pdf_in_flight", "PDF renders currently running.", lambda: pdf_service.in_flight)
+    metrics.gauge("ocr_cache_hits_total", "OCR results served from the cache.", lambda: get_ocr_cache().hits, "counter")
+    metrics.gauge("ocr_cache_misses_total", "OCR cache lookups that found nothing.", lambda: get_ocr_cache().misses, "counter")
+    metrics.gauge("ocr_image_bytes_before_total", "Size of the photos downloaded for OCR.", lambda: ocr_image_bytes["before"], "counter")
+    metrics.gauge("ocr_image_bytes_after_total", "Size of the preprocessed images uploaded for OCR.", lambda: ocr_image_bytes["after"], "counter")
+    metrics.gauge("response_cache_hits_total", "Replies served from the response cache.", lambda: response_cache.hits, "counter")
+    metrics.gauge("response_cache_misses_total", "Cached prompts that needed a live completion.", lambda: response_cache.misses, "counter")
+    metrics.gauge("llm_requests_started_total", "LLM requests sent upstream by the single-flight layer.", lambda: response_flights.leaders, "counter")
+    metrics.gauge("llm_requests_coalesced_total", "LLM calls answered by joining an identical request in flight.", lambda: response_flights.followers, "counter")
+    metrics.gauge("llm_coalescing_ratio", "Share of LLM calls answered by a shared request.", lambda: response_flights.coalescing_ratio)
+    metrics.gauge("policy_prefetch_pending", "Prefetched policies held for users who have not answered the price yet.", lambda: policy_prefetch.pending)
+    metrics.gauge("policy_prefetch_hits_total", "Policies delivered from a speculative prefetch.", lambda: policy_prefetch.hits, "counter")
+    metrics.gauge("policy_prefetch_misses_total", "Policies built after the price was agreed.", lambda: policy_prefetch.misses, "counter")
+    for service in ("telegram", "mindee", "openai"):
+        metrics.gauge(f"{service}_outbound_queued", f"Calls to {service} waiting for a rate-limit token.", lambda service=service: outbound.queued(service))
+    for breaker in (mindee_client.breaker, openai_breaker):
+        metrics.gauge(f"{breaker.name}_circuit_open", f"1 while calls to {breaker.name} are refused.", lambda breaker=breaker: int(breaker.is_open))
+        metrics.gauge(f"{breaker.name}_circuit_trips_total", f"Times the {breaker.name} circuit has opened.", lambda breaker=breaker: breaker.trips, "counter")
+    metrics.gauge("sessions", "Sessions held in memory.", lambda: session_stats()["sessions"])
+    metrics.gauge("sessions_bytes", "Estimated memory used by the sessions held in memory.", lambda: session_stats()["bytes"])
+
+
+async def run_webhook(bot):
+    """Receives updates through a local aiohttp webhook server until cancelled."""
+
+    server = WebhookServer(bot, dispatcher, secret_token=config.WEBHOOK_SECRET, path=config.WEBHOOK_PATH)
+    await server.start(config.WEBHOOK_HOST, config.WEBHOOK_PORT, config.WEBHOOK_URL + config.WEBHOOK_PATH)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+async def main(webhook=False):
+    """
+    Runs the bot on a single asyncio event loop.
+    Every update is handled as its own task, so slow Mindee/OpenAI calls
+    of one user never block the conversations of other users.
+    Updates come from long polling, or from a webhook server with webhook=True.
+    """
+
+    setup_logging()
+    bot = create_bot()
+    register_gauges()
+    log.info("Бот запущено...")  # Bot started
+
+    # Restore and pre-generate replies to static prompts without delaying startup
+    warm_up_task = asyncio.create_task(warm_up_response_cache())
+
+    # Local Prometheus endpoint with hot-path timings, plus runtime logging settings
+    metrics_runner = None
+    if config.METRICS_PORT:
+        logging_routes = [("GET", "/logging", handle_logging_settings), ("POST", "/logging", handle_logging_settings)]
+        metrics_runner = await metrics.start_server(config.METRICS_HOST, config.METRICS_PORT, routes=logging_routes)
+
+    try:
+        if webhook:
+            await run_webhook(bot)
+        else:
+            await bot.remove_webhook()
+            await dispatcher.poll(bot)  # Start polling for updates, pausing while the dispatcher is full
+    finally:
+        # Stop background work and release HTTP sessions held by the bot and the services
+        warm_up_task.cancel()
+        policy_prefetch.clear()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        save_response_cache()
+        await vehicle_jobs.stop()
+        await mindee_client.close()
+        await close_openai_client()
+        await bot.close_session()
+        pdf_service.shutdown()
+        close_sessions()
+        close_ocr_cache()
+        shutdown_logging()
+
 
 # Start the bot if this script is run directly
 if __name__ == "__main__":
-    print("Бот запущено...")  # Bot started
-    bot.polling(none_stop=True)  # Start polling for updates
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Car insurance Telegram bot")
+    parser.add_argument("--webhook", action="store_true", help="receive updates through a webhook server instead of polling")
+    args = parser.parse_args()
+
+    # Without a URL there is nothing to register; without a secret every update would be rejected
+    if args.webhook:
+        missing = [name for name in ("WEBHOOK_URL", "WEBHOOK_SECRET") if not getattr(config, name)]
+        if missing:
+            parser.exit(2, f"Webhook mode requires {' and '.join(missing)} to be set.\n")
+
+    try:
+        asyncio.run(main(webhook=args.webhook))
+    except KeyboardInterrupt:
+        pass
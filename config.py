@@ -12,5 +12,114 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 # Mindee API key for document parsing services
 MINDEE_API_KEY = os.getenv("MINDEE_API_KEY")
 
+# Mindee API base URL (overridden to point at a local stand-in in load tests)
+MINDEE_API_URL = os.getenv("MINDEE_API_URL", "https://api.mindee.net").rstrip("/")
+
 # OpenAI API key for chatbot functionality
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
\ No newline at end of file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Mindee async vehicle job polling (seconds)
+MINDEE_POLL_INITIAL_DELAY = float(os.getenv("MINDEE_POLL_INITIAL_DELAY", "2"))
+MINDEE_POLL_MAX_INTERVAL = float(os.getenv("MINDEE_POLL_MAX_INTERVAL", "10"))
+MINDEE_POLL_BACKOFF = float(os.getenv("MINDEE_POLL_BACKOFF", "1.6"))
+MINDEE_JOB_TIMEOUT = float(os.getenv("MINDEE_JOB_TIMEOUT", "90"))
+
+# Mindee HTTP client (connection pool, timeouts in seconds, retries)
+MINDEE_POOL_SIZE = int(os.getenv("MINDEE_POOL_SIZE", "50"))
+MINDEE_CONNECT_TIMEOUT = float(os.getenv("MINDEE_CONNECT_TIMEOUT", "5"))
+MINDEE_READ_TIMEOUT = float(os.getenv("MINDEE_READ_TIMEOUT", "30"))
+MINDEE_MAX_RETRIES = int(os.getenv("MINDEE_MAX_RETRIES", "3"))
+MINDEE_PASSPORT_CONCURRENCY = int(os.getenv("MINDEE_PASSPORT_CONCURRENCY", "10"))
+MINDEE_VEHICLE_CONCURRENCY = int(os.getenv("MINDEE_VEHICLE_CONCURRENCY", "10"))
+MINDEE_POLL_CONCURRENCY = int(os.getenv("MINDEE_POLL_CONCURRENCY", "20"))
+
+# Cache of LLM replies to static prompts
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.json")
+RESPONSE_CACHE_VARIANTS = int(os.getenv("RESPONSE_CACHE_VARIANTS", "3"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX_KEYS = int(os.getenv("RESPONSE_CACHE_MAX_KEYS", "256"))
+
+# Policy generation: sections personalised by the LLM (comma-separated, empty = template only)
+# and the time budget in seconds after which the template text is used instead
+POLICY_ENRICH_SECTIONS = [s.strip() for s in os.getenv("POLICY_ENRICH_SECTIONS", "").split(",") if s.strip()]
+POLICY_LLM_BUDGET = float(os.getenv("POLICY_LLM_BUDGET", "3"))
+
+# PDF rendering process pool: worker processes and maximum queued render requests
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MAX_QUEUE = int(os.getenv("PDF_MAX_QUEUE", "100"))
+
+# Session storage: "memory" (process-local) or "sqlite" (durable, shared between workers)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.5"))
+# Seconds a cached session is trusted before it is re-read from a shared store (empty = forever)
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL")) if os.getenv("SESSION_CACHE_TTL") else None
+# Sessions idle for longer than this many seconds are evicted (empty = never)
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "86400")) if os.getenv("SESSION_IDLE_TTL", "86400") else None
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+# Webhook mode (python bot.py --webhook)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Public HTTPS URL Telegram delivers updates to
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+
+# Maximum number of updates processed concurrently (each user's updates run in order)
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "64"))
+# Updates waiting across all user queues before new ones are refused (webhook: 503) or left on Telegram's side (polling)
+DISPATCH_MAX_QUEUE = int(os.getenv("DISPATCH_MAX_QUEUE", "1000"))
+
+# Image preprocessing before OCR upload
+OCR_TARGET_SIDE = int(os.getenv("OCR_TARGET_SIDE", "800"))   # Minimum shorter side (px) of the Telegram photo size to download
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "1600"))        # Longer side (px) after downscaling
+OCR_MAX_BYTES = int(os.getenv("OCR_MAX_BYTES", "400000"))    # Size cap of the re-encoded JPEG
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+
+# Content-addressed cache of OCR results
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.db")
+OCR_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", "86400"))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "10000"))
+OCR_CACHE_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "4"))  # Max differing perceptual-hash bits
+
+# Prometheus metrics endpoint (local by default; empty port disables it)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100")) if os.getenv("METRICS_PORT", "9100") else None
+
+# Logging: level, "text" or "json" lines, and sampling rates of high-frequency events ("event=rate,...")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "mindee.poll=0.1,mindee.retry=0.5")
+LOG_REDACT = os.getenv("LOG_REDACT", "1") != "0"  # Mask passport and vehicle data in log fields
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records beyond this are dropped, never blocking
+
+# Speculative policy generation while the user is asked to accept the price
+POLICY_PREFETCH_TTL = float(os.getenv("POLICY_PREFETCH_TTL", "300"))        # Seconds a prefetched PDF is kept
+POLICY_PREFETCH_MAX_SLOTS = int(os.getenv("POLICY_PREFETCH_MAX_SLOTS", "500"))
+
+# Maximum number of callers sharing one in-flight LLM request (identical prompts are coalesced)
+LLM_MAX_FANOUT = int(os.getenv("LLM_MAX_FANOUT", "100"))
+
+# Streamed replies: minimum seconds between message edits and new characters per edit
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_MIN_GROWTH = int(os.getenv("STREAM_MIN_GROWTH", "20"))
+
+# Outbound rate limits (requests per second and burst size; a rate of 0 disables the limit)
+TELEGRAM_RATE = float(os.getenv("TELEGRAM_RATE", "30"))            # Bot API global limit
+TELEGRAM_BURST = int(os.getenv("TELEGRAM_BURST", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))   # Per-chat limit
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "4"))
+MINDEE_RATE = float(os.getenv("MINDEE_RATE", "10"))
+MINDEE_BURST = int(os.getenv("MINDEE_BURST", "10"))
+OPENAI_RATE = float(os.getenv("OPENAI_RATE", "50"))
+OPENAI_BURST = int(os.getenv("OPENAI_BURST", "50"))
+
+# Latency budget (seconds) of each handler step, shared by every external call it makes; "step=seconds,..." overrides
+STEP_BUDGET = float(os.getenv("STEP_BUDGET", "30"))
+STEP_BUDGETS = os.getenv("STEP_BUDGETS", "start=10,passport_confirm=10,vehicle_confirm=15")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "10"))       # Cap of a single OpenAI request
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+
+# Circuit breakers: consecutive failures that open one, and seconds before a trial call
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
@@ -1,72 +1,85 @@
 # handlers/passport_handler.py
 
-from telebot import TeleBot, types
+import asyncio
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
 from services.mindee_service import extract_passport_data
-from services.openai_service import generate_bot_response
-from utils.state_manager import get_state, set_state, clear_state
+from services.ocr_cache import get_ocr_cache
+from services.openai_service import generate_bot_response, stream_bot_response
+from services.prompts import PASSPORT_PROCESSING_PROMPT, PASSPORT_ERROR_PROMPT, PASSPORT_CONFIRMED_PROMPT, PASSPORT_REUPLOAD_PROMPT
+from utils.state_manager import get_state, set_state, clear_state, set_user_data
+from utils.image_preprocess import pick_photo_size, prepare_for_ocr
+from utils.logger import get_logger
+from utils.metrics import span, step
+from utils.streaming import send_streamed_message
 import config
 
+log = get_logger("Passport Handler")
 
-def handle_passport_photo(bot: TeleBot, message):
+
+async def _acknowledge(bot: AsyncTeleBot, chat_id):
+    """Sends the "processing" message; a failure here does not stop the OCR step."""
+    try:
+        await bot.send_message(chat_id, await generate_bot_response(PASSPORT_PROCESSING_PROMPT, cache=True))
+    except Exception as e:
+        log.warning("Could not send acknowledgement", user_id=chat_id, error=e)
+
+
+@step("passport")
+async def handle_passport_photo(bot: AsyncTeleBot, message):
     """
     Handles the user's passport photo upload.
     Extracts data using Mindee API and asks the user to confirm the extracted details.
+    The acknowledgement is sent while the photo is downloaded and read, so the
+    step takes about as long as the OCR branch alone.
     """
 
-    print("[DEBUG] Passport Handler - Processing photo")
     user_id = message.from_user.id
     current_state = get_state(user_id)
 
     # Only respond if user is in the correct state
     if current_state != "awaiting_passport":
-        print(f"[DEBUG] Passport Handler - Ignored photo. Expected state: 'awaiting_passport', got: '{current_state}'")
+        log.debug("Ignored photo", user_id=user_id, expected="awaiting_passport", state=current_state)
         return
 
-    # Notify the user that we're processing the passport
-    processing_prompt = "The user has uploaded a passport photo. Please confirm that you are now processing the document."
-    bot.send_message(message.chat.id, generate_bot_response(processing_prompt))
+    # Notify the user that we're processing the passport, concurrently with the OCR branch
+    ack = asyncio.create_task(_acknowledge(bot, message.chat.id))
 
     try:
-        # Get the highest resolution image from the message
-        file_id = message.photo[-1].file_id
-        file_info = bot.get_file(file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
+        # Get the smallest image that is still large enough for OCR
+        file_id = pick_photo_size(message.photo).file_id
+        with span("telegram_get_file"):
+            file_info = await bot.get_file(file_id)
+        with span("telegram_download"):
+            downloaded_file = await bot.download_file(file_info.file_path)
+        downloaded_file = await prepare_for_ocr(downloaded_file, label=f"passport {user_id}")
 
         # Use Mindee API to extract data from the passport image
-        extracted_data = extract_passport_data(downloaded_file, config.MINDEE_API_KEY)
+        extracted_data = await extract_passport_data(downloaded_file, config.MINDEE_API_KEY, cache_scope=user_id)
 
         if not extracted_data:
             raise ValueError("Не вдалося витягти дані з паспорта")
 
-        # Extract prediction data from the response
-        prediction = (
-            extracted_data.get("document", {})
-            .get("inference", {})
-            .get("prediction", {})
-        )
-
         # Extract key information from the prediction
-        surname = prediction.get("surname", {}).get("value", "-")
-        given_names = prediction.get("given_names", [{}])[0].get("value", "-")
-        birth_date = prediction.get("birth_date", {}).get("value", "-")
-
-        # Initialize user data storage if needed
-        bot.user_data = getattr(bot, "user_data", {})
-        if user_id not in bot.user_data:
-            bot.user_data[user_id] = {}
+        surname = extracted_data["surname"]
+        given_names = extracted_data["given_names"]
+        birth_date = extracted_data["birth_date"]
 
         # Save passport data to user context
-        bot.user_data[user_id]["passport"] = {
+        set_user_data(user_id, "passport", {
             "surname": surname,
             "given_names": [given_names],
             "birth_date": birth_date
-        }
-        bot.user_data[user_id]["confirmed"] = False  # Default confirmation status
+        })
+        set_user_data(user_id, "confirmed", False)  # Default confirmation status
 
         # Generate summary prompt asking for confirmation
         summary_prompt = f"Summarize and ask the user to confirm their passport details: Name: {given_names}, Surname: {surname}, Date of Birth: {birth_date}"
-        summary_message = generate_bot_response(summary_prompt)
-        bot.send_message(message.chat.id, summary_message)
+        await ack  # The acknowledgement always comes first
+
+        # Stream the summary into one message that grows as the reply arrives
+        fallback = f"Please confirm your passport details:\nName: {given_names}\nSurname: {surname}\nDate of Birth: {birth_date}"
+        await send_streamed_message(bot, message.chat.id, stream_bot_response(summary_prompt, fallback=fallback))
 
         # Provide inline buttons for confirmation
         markup = types.InlineKeyboardMarkup()
@@ -74,62 +87,65 @@ def handle_passport_photo(bot: TeleBot, message):
             types.InlineKeyboardButton("✅ Yes", callback_data="confirm_passport_yes"),
             types.InlineKeyboardButton("❌ No", callback_data="confirm_passport_no")
         )
-        bot.send_message(message.chat.id, "Are the details correct?", reply_markup=markup)
+        await bot.send_message(message.chat.id, "Are the details correct?", reply_markup=markup)
 
         # Move to confirmation state
         set_state(user_id, "confirm_passport")
 
     except Exception as e:
         # Log and inform the user about any errors
-        print(f"[Data Extraction] Error: {e}")
-        error_prompt = "There was an issue reading the passport. Please upload a clearer image."
-        bot.send_message(message.chat.id, generate_bot_response(error_prompt))
+        log.error("Passport extraction failed", user_id=user_id, error=e)
+        await ack
+        await bot.send_message(message.chat.id, await generate_bot_response(PASSPORT_ERROR_PROMPT, cache=True))
 
 
-def register_passport_callback_handlers(bot: TeleBot):
+def register_passport_callback_handlers(bot: AsyncTeleBot):
     """
     Registers inline button handlers for confirming or rejecting passport data.
     """
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith("confirm_passport_"))
-    def handle_confirmation(call):
+    @step("passport_confirm")
+    async def handle_confirmation(call):
         user_id = call.from_user.id
         current_state = get_state(user_id)
 
         if current_state != "confirm_passport":
-            bot.answer_callback_query(call.id, "Unknown request.")
+            await bot.answer_callback_query(call.id, "Unknown request.")
             return
 
         if call.data == "confirm_passport_yes":
             # User confirmed the data
-            bot.user_data[user_id]["confirmed"] = True
+            set_user_data(user_id, "confirmed", True)
 
             # Inform them what to do next (upload vehicle document)
-            response_prompt = "The passport data has been confirmed. Please send a clear photo of the front page of your vehicle registration certificate, where the license plate number is visible."
-            bot.answer_callback_query(call.id)
-            bot.edit_message_text(
+            await bot.answer_callback_query(call.id)
+            await bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=generate_bot_response(response_prompt),
+                text=await generate_bot_response(PASSPORT_CONFIRMED_PROMPT, cache=True),
                 reply_markup=None
             )
 
             # Move to next step in the process
             set_state(user_id, "awaiting_vehicle_doc_license_plate")
-            print(f"[DEBUG] Passport Handler - State set to 'awaiting_vehicle_doc' for user {user_id}")
+            log.debug("Passport confirmed", user_id=user_id, state="awaiting_vehicle_doc_license_plate")
 
         elif call.data == "confirm_passport_no":
             # Data rejected — reset and ask for re-upload
-            bot.answer_callback_query(call.id)
-            bot.edit_message_text(
+            await bot.answer_callback_query(call.id)
+
+            # Forget the rejected reading, so a retake of the same photo is read again
+            await get_ocr_cache().invalidate("passport", user_id)
+            await bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=generate_bot_response("Please re-upload your passport photo."),
+                text=await generate_bot_response(PASSPORT_REUPLOAD_PROMPT, cache=True),
                 reply_markup=None
             )
 
             clear_state(user_id)
             set_state(user_id, "awaiting_passport")
-            print(f"[DEBUG] Passport Handler - State reset to 'awaiting_passport' for user {user_id}")
+            log.debug("Passport rejected", user_id=user_id, state="awaiting_passport")
 
-        bot.answer_callback_query(call.id)  # Dismiss loading spinner
\ No newline at end of file
+        await bot.answer_callback_query(call.id)  # Dismiss loading spinner
\ No newline at end of file
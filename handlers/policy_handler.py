@@ -1,82 +1,99 @@
 # handlers/policy_handler.py
 
+import asyncio
 from services.openai_service import generate_insurance_policy
-from utils.pdf_generator import generate_pdf
-from telebot import TeleBot, types
-import os
+from services.pdf_service import pdf_service
+from services.policy_prefetch import policy_prefetch
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from io import BytesIO
 
-from utils.state_manager import get_state, set_state
+from utils.state_manager import get_state, set_state, get_user_data
 from services.openai_service import generate_bot_response
+from services.prompts import POLICY_READY_PROMPT
+from utils.logger import get_logger
+from utils.metrics import step
 
-# Configure logging
+log = get_logger("Policy")
 
 
-def send_insurance_policy_handler(message: types.Message, bot: TeleBot):
+@step("policy")
+async def send_insurance_policy_handler(message: types.Message, bot: AsyncTeleBot, summary_text=None):
     """
     Handles the generation and delivery of the insurance policy document.
-    - Uses user data to generate a policy using OpenAI
-    - Converts the result into a PDF
-    - Sends the PDF to the user
-    - Deletes the temporary file afterward
+    - Uses user data to generate the policy text
+    - Renders the result into an in-memory PDF
+    - Sends the PDF to the user without touching the disk
+    The progress notice and the closing summary text are produced alongside
+    the policy text -> PDF branch; messages still arrive in order. A PDF
+    prefetched since the vehicle confirmation is used when available.
+    ``summary_text`` is the closing message, if the calling step already generated it.
     """
 
     chat_id = message.chat.id
-    print(f"[Policy] Generating policy for user {chat_id}")
+    log.info("Generating policy", user_id=chat_id)
 
     try:
         # Check if user data exists
-        user_data = bot.user_data.get(chat_id)
+        user_data = get_user_data(chat_id)
 
         if not user_data:
-            print(f"[Policy] No user data found for chat_id={chat_id}")
-            bot.send_message(chat_id, "⚠️ Error: No data to generate the policy.")
+            log.warning("No user data found", user_id=chat_id)
+            await bot.send_message(chat_id, "⚠️ Error: No data to generate the policy.")
             return
 
-        print(f"[Policy] User data: {user_data}")
+        log.debug("Policy data", user_id=chat_id, user_data=user_data)
 
-        # Notify user that the policy is being generated
-        bot.send_message(chat_id, "📄 Generating your insurance policy...")
+        # Use the policy built speculatively during price confirmation, if it is still valid
+        prefetched = policy_prefetch.take(chat_id, user_data)
 
-        # Generate policy text using OpenAI
-        policy_text = generate_insurance_policy(user_data)
+        # Notify the user (unless the PDF is already waiting) and prepare the closing summary
+        notice = None
+        if prefetched is None or not prefetched.done():
+            notice = asyncio.create_task(bot.send_message(chat_id, "📄 Generating your insurance policy..."))
+        summary = None
+        if summary_text is None:
+            summary = asyncio.create_task(generate_bot_response(POLICY_READY_PROMPT, cache=True))
 
-        # Define path for the PDF file
-        pdf_path = f"policy_{chat_id}.pdf"
+        try:
+            pdf_bytes = await prefetched if prefetched is not None else None
 
-        # Create the PDF document
-        generate_pdf(policy_text, pdf_path)
-        print(f"[Policy] PDF generated at {pdf_path}")
+            if pdf_bytes is None:
+                # Generate policy text
+                policy_text = await generate_insurance_policy(user_data)
 
-        # Send the PDF document to the user
-        with open(pdf_path, "rb") as pdf_file:
-            bot.send_document(chat_id, pdf_file)
-            print(f"[Policy] Policy sent to user {chat_id}")
+                # Render the PDF in the process pool so the event loop stays responsive
+                pdf_bytes = await pdf_service.render(policy_text)
+                log.debug("PDF rendered", user_id=chat_id, bytes=len(pdf_bytes))
 
-        # Inform the user about the generated policy
-        summary_prompt = "Inform the user that the insurance policy is ready and they can review it in the attached file."
-        summary_message = generate_bot_response(summary_prompt)
-        bot.send_message(message.chat.id, summary_message)
+            # Send the PDF buffer directly to the user, after the notice
+            if notice is not None:
+                await notice
+            await bot.send_document(chat_id, BytesIO(pdf_bytes), visible_file_name=f"policy_{chat_id}.pdf")
+            log.info("Policy sent", user_id=chat_id)
 
-        # Delete the temporary PDF file after sending
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
-            print(f"[Policy] Deleted temporary file {pdf_path}")
+            # Inform the user about the generated policy
+            await bot.send_message(chat_id, summary_text if summary is None else await summary)
+        finally:
+            if summary is not None:
+                summary.cancel()
+            await asyncio.gather(*filter(None, (notice, summary)), return_exceptions=True)
 
         # Update user state to reflect completion
         set_state(chat_id, "policy_sent")
 
     except Exception as e:
         # Log and inform the user about any errors
-        print(f"[Policy] Error generating policy for user {chat_id}: {e}")
-        bot.send_message(chat_id, "❌ An error occurred while generating the policy.")
+        log.error("Error generating policy", user_id=chat_id, error=e)
+        await bot.send_message(chat_id, "❌ An error occurred while generating the policy.")
 
 
-def register_policy_handler(bot: TeleBot):
+def register_policy_handler(bot: AsyncTeleBot):
     """
     Registers the handler for sending the insurance policy.
     Triggers only when the user is in the 'confirm_purchase' state.
     """
 
     @bot.message_handler(func=lambda message: get_state(message.chat.id) == "confirm_purchase")
-    def handler_wrapper(message: types.Message):
-        send_insurance_policy_handler(message, bot)
\ No newline at end of file
+    async def handler_wrapper(message: types.Message):
+        await send_insurance_policy_handler(message, bot)
\ No newline at end of file
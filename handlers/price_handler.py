@@ -1,15 +1,24 @@
 # handlers/price_handler.py
 
-from telebot import TeleBot, types
-from services.openai_service import generate_bot_response
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+from services.openai_service import generate_bot_response, generate_step_messages
+from services.policy_prefetch import policy_prefetch
+from services.prompts import PRICE_PROMPT, PRICE_AGREED_PROMPT, PRICE_FIXED_PROMPT, POLICY_READY_PROMPT
 from utils.state_manager import get_state, set_state
 from handlers.policy_handler import send_insurance_policy_handler
+from utils.logger import get_logger
+from utils.metrics import step
 
+log = get_logger("Price Handler")
 
-def ask_price_confirmation(bot: TeleBot, message):
+
+async def ask_price_confirmation(bot: AsyncTeleBot, message, confirmation_text=None):
     """
     Sends a message asking the user to confirm the fixed insurance price.
     Provides inline buttons for confirmation (Yes/No).
+    ``confirmation_text`` is the already generated PRICE_PROMPT reply, when the
+    calling step generated it together with its own messages.
     """
 
     # Create inline keyboard with 'Yes' and 'No' options
@@ -19,69 +28,75 @@ def ask_price_confirmation(bot: TeleBot, message):
     markup.add(btn_yes, btn_no)
 
     # Generate response using AI
-    prompt = "Inform the user about the fixed insurance price of $100 and ask if they agree to proceed."
-    confirmation_text = generate_bot_response(prompt)
+    if confirmation_text is None:
+        confirmation_text = await generate_bot_response(PRICE_PROMPT, cache=True)
 
     # Send message with price confirmation buttons
-    bot.send_message(
+    await bot.send_message(
         message.chat.id,
         confirmation_text,
         reply_markup=markup
     )
 
     # Update user state to track conversation flow
-    set_state(message.from_user.id, "price_confirmation")
+    set_state(message.chat.id, "price_confirmation")
 
 
-def register_price_handler(bot: TeleBot):
+def register_price_handler(bot: AsyncTeleBot):
     """
     Registers callback handlers for price confirmation buttons.
     Handles user interaction with the price confirmation step.
     """
 
     @bot.callback_query_handler(func=lambda call: True)
-    def handle_price_callback(call):
+    @step("price")
+    async def handle_price_callback(call):
         user_id = call.from_user.id
         current_state = get_state(user_id)
 
-        print(f"[Price Handler] Callback received. State: '{current_state}'")
+        log.debug("Callback received", user_id=user_id, state=current_state)
 
         # Ensure this handler only responds to relevant callbacks
         if current_state != "price_confirmation":
-            bot.answer_callback_query(call.id, "Unknown request.")
+            await bot.answer_callback_query(call.id, "Unknown request.")
             return
 
         if call.data == "price_agree":
-            bot.answer_callback_query(call.id)
+            await bot.answer_callback_query(call.id)
             
+            # Generate this step's messages together: the agreement reply and the closing summary
+            messages = await generate_step_messages(
+                {"agreed": PRICE_AGREED_PROMPT, "policy_ready": POLICY_READY_PROMPT}, cache=True
+            )
+
             # Notify user and update message
-            response = generate_bot_response("The user has agreed to the price. Generating the insurance policy now.")
-            bot.edit_message_text(
+            await bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=response
+                text=messages["agreed"]
             )
 
             # Update user state
             set_state(user_id, "policy_generation")
 
             # Proceed to generate the insurance policy
-            send_insurance_policy_handler(call.message, bot)  # Pass both message and bot
+            await send_insurance_policy_handler(call.message, bot, summary_text=messages["policy_ready"])
 
         elif call.data == "price_disagree":
-            bot.answer_callback_query(call.id)
+            await bot.answer_callback_query(call.id)
+            policy_prefetch.discard(user_id)
             
-            # Inform user that price is fixed and ask again
-            response = generate_bot_response("Unfortunately, the price of $100 is fixed and cannot be changed. Would you like to proceed with the purchase?")
-            bot.edit_message_text(
+            # Inform user that price is fixed and ask again, with both messages from one request
+            messages = await generate_step_messages({"fixed": PRICE_FIXED_PROMPT, "price": PRICE_PROMPT}, cache=True)
+            await bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=response,
+                text=messages["fixed"],
                 reply_markup=None
             )
 
             # Ask again for price confirmation
-            ask_price_confirmation(bot, call.message)
+            await ask_price_confirmation(bot, call.message, messages["price"])
 
         else:
-            bot.answer_callback_query(call.id, "Unknown command.")
\ No newline at end of file
+            await bot.answer_callback_query(call.id, "Unknown command.")
\ No newline at end of file
@@ -1,17 +1,21 @@
 # handlers/start_handler.py
 
-from telebot import TeleBot, types
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
 from services.openai_service import generate_bot_response
+from services.prompts import WELCOME_PROMPT, START_INSTRUCTION_PROMPT
+from utils.metrics import step
 
 
-def register_start_handlers(bot: TeleBot):
+def register_start_handlers(bot: AsyncTeleBot):
     """
     Registers handlers for the /start command and the '🚗 Start' button.
     These handlers welcome the user and prompt them to upload a passport photo.
     """
 
     @bot.message_handler(commands=['start'])
-    def send_welcome(message):
+    @step("start")
+    async def send_welcome(message):
         """
         Handles the '/start' command.
         Sends a friendly welcome message with a 'Start' button.
@@ -23,28 +27,27 @@ def register_start_handlers(bot: TeleBot):
         markup.add(btn_start)
 
         # Generate a welcome message using OpenAI
-        welcome_prompt = "The user has started the bot. Welcome them and ask to send their passport photo to begin the insurance process."
-        reply_text = generate_bot_response(welcome_prompt)
+        reply_text = await generate_bot_response(WELCOME_PROMPT, cache=True)
 
         # Send the welcome message along with the keyboard
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             reply_text,
             reply_markup=markup
         )
 
     @bot.message_handler(func=lambda message: message.text == "🚗 Start")
-    def handle_start(message):
+    @step("start")
+    async def handle_start(message):
         """
         Handles when the user clicks the '🚗 Start' button.
         Prompts them to upload a photo of their passport.
         """
 
         # Ask the user to send their passport photo using AI-generated text
-        instruction_prompt = "Ask the user to send a photo of their passport to proceed with the car insurance application."
-        reply_text = generate_bot_response(instruction_prompt)
+        reply_text = await generate_bot_response(START_INSTRUCTION_PROMPT, cache=True)
 
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             reply_text
         )
@@ -1,74 +1,112 @@
 # handlers/vehicle_handler.py
 
-from telebot import TeleBot, types
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
 from services.mindee_service import extract_vehicle_data
-from services.openai_service import generate_bot_response
-from utils.state_manager import get_state, set_state, clear_state
+from services.ocr_cache import get_ocr_cache
+from services.openai_service import generate_bot_response, generate_step_messages, stream_bot_response
+from services.policy_prefetch import policy_prefetch
+from services.prompts import VEHICLE_VIN_REQUEST_PROMPT, VEHICLE_ERROR_PROMPT, VEHICLE_CONFIRMED_PROMPT, VEHICLE_REUPLOAD_PROMPT, PRICE_PROMPT
+from utils.state_manager import get_state, set_state, clear_state, get_user_data, set_user_data
+from utils.dispatcher import dispatcher
+from utils.image_preprocess import pick_photo_size, prepare_for_ocr
+from utils.logger import get_logger
+from utils.metrics import span, step
+from utils.streaming import send_streamed_message
+from utils.session import Session
+from utils.vin import decode_vin
 import config
 
-def handle_vehicle_photo(bot: TeleBot, message):
+log = get_logger("Vehicle Handler")
+
+@step("vehicle")
+async def handle_vehicle_photo(bot: AsyncTeleBot, message):
     """
     Handles incoming vehicle document photos from users.
-    Extracts vehicle data using Mindee API and updates user state accordingly.
+    Submits the image to Mindee and returns immediately; the extracted data
+    is processed by continue_vehicle_flow when the background job completes.
     """
 
-    print("[Vehicle Handler] Processing vehicle document photo")
     user_id = message.from_user.id
     current_state = get_state(user_id)
-    print(f"[Vehicle Handler] User {user_id} in state '{current_state}'")
+    log.debug("Processing vehicle document photo", user_id=user_id, state=current_state)
 
     # Check if the user is expected to upload a vehicle document
     if current_state not in ["awaiting_vehicle_doc_license_plate", "awaiting_vehicle_doc_vin"]:
-        print(f"[Vehicle Handler] Ignored photo. Expected states: 'awaiting_vehicle_doc_license_plate' or 'awaiting_vehicle_doc_vin', got: '{current_state}'")
+        log.debug("Ignored photo", user_id=user_id, state=current_state)
         return
 
     try:
-        # Get the highest resolution photo
-        file_id = message.photo[-1].file_id
-        file_info = bot.get_file(file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
+        # Get the smallest photo that is still large enough for OCR
+        file_id = pick_photo_size(message.photo).file_id
+        with span("telegram_get_file"):
+            file_info = await bot.get_file(file_id)
+        with span("telegram_download"):
+            downloaded_file = await bot.download_file(file_info.file_path)
+        downloaded_file = await prepare_for_ocr(downloaded_file, label=f"vehicle {user_id}")
+
+        # Resume the conversation once the background Mindee job completes,
+        # queued behind any other pending updates of the same user
+        async def on_result(prediction):
+            dispatcher.submit(user_id, lambda: continue_vehicle_flow(bot, message, current_state, prediction))
+
+        # Submit the image to Mindee; polling happens in the shared job tracker
+        job_id = await extract_vehicle_data(downloaded_file, config.MINDEE_API_KEY, on_result, cache_scope=user_id)
+
+        if not job_id:
+            raise ValueError("Не вдалося витягти дані з документа")
+
+        log.debug("Submitted Mindee job", user_id=user_id, job_id=job_id)
+
+    except Exception as e:
+        log.error("Vehicle submission failed", user_id=user_id, error=e)
+        await bot.send_message(message.chat.id, await generate_bot_response(VEHICLE_ERROR_PROMPT, cache=True))
+
+
+@step("vehicle")
+async def continue_vehicle_flow(bot: AsyncTeleBot, message, expected_state, prediction):
+    """
+    Continues the vehicle step with the result of a completed Mindee job.
+    Saves the extracted data and moves the user to the next state.
+    """
 
-        # Use Mindee to extract data from the image
-        prediction = extract_vehicle_data(downloaded_file, config.MINDEE_API_KEY)
-        print(f"[Vehicle Handler] Extracted prediction: {prediction}")
+    user_id = message.from_user.id
+    log.debug("Vehicle result received", user_id=user_id, prediction=prediction)
+
+    # Drop stale results if the user moved on while the job was running
+    if get_state(user_id) != expected_state:
+        log.info("Discarded stale vehicle result", user_id=user_id, expected=expected_state)
+        return
 
+    try:
         if not prediction:
             raise ValueError("Не вдалося витягти дані з документа")
 
-        # Initialize user data storage if needed
-        bot.user_data = getattr(bot, "user_data", {})
-        if user_id not in bot.user_data:
-            bot.user_data[user_id] = {}
-
-        # Handle based on current expected input
-        if current_state == "awaiting_vehicle_doc_license_plate":
-            license_plate = prediction.get("license_plate", "-")
-            bot.user_data[user_id]["vehicle"] = {
-                "license_plate": license_plate,
-            }
-            print(f"[Vehicle Handler] License plate saved: {license_plate}")
-            set_state(user_id, "awaiting_vehicle_doc_vin")
+        # Keep every field of this OCR result, merged with the previous document's fields
+        previous = get_user_data(user_id).get("vehicle", {}) if expected_state == "awaiting_vehicle_doc_vin" else {}
+        vehicle = merge_vehicle_data(previous, check_vin(prediction))
+        fill_make_from_vin(vehicle)
+        set_user_data(user_id, "vehicle", vehicle)
+        log.debug("Vehicle data saved", user_id=user_id, vehicle=vehicle)
 
-            prompt = "Please upload a photo with the VIN code and make of the vehicle."
-            bot.send_message(message.chat.id, generate_bot_response(prompt))
+        # Ask for a second document only if the first one lacked VIN/make/model
+        if expected_state == "awaiting_vehicle_doc_license_plate" and not has_vin_details(vehicle):
+            set_state(user_id, "awaiting_vehicle_doc_vin")
+            await bot.send_message(message.chat.id, await generate_bot_response(VEHICLE_VIN_REQUEST_PROMPT, cache=True))
 
-        elif current_state == "awaiting_vehicle_doc_vin":
-            vin = prediction.get("vin", "-")
-            make = prediction.get("make", "-")  # Make may be present in response
-            model = prediction.get("model", "-")  # Model may also be available
+        # The VIN document did not yield a valid VIN: ask for a clearer photo right away
+        elif not _is_usable(vehicle["vin"]):
+            await bot.send_message(message.chat.id, await generate_bot_response(VEHICLE_ERROR_PROMPT, cache=True))
 
-            bot.user_data[user_id]["vehicle"].update({
-                "vin": vin,
-                "make": make,
-                "model": model
-            })
-            print(f"[Vehicle Handler] VIN and make/model saved: {vin}, {make} {model}")
+        else:
+            vin, make, model = vehicle["vin"], vehicle["make"], vehicle["model"]
 
             # Ask user to confirm the extracted details
             set_state(user_id, "confirm_vehicle")
-            summary_prompt = f"Summarize and ask the user to confirm their vehicle details: VIN: {vin}, Make: {make}, Model: {model}, License Plate: {bot.user_data[user_id]['vehicle']['license_plate']}"
-            summary_message = generate_bot_response(summary_prompt)
-            bot.send_message(message.chat.id, summary_message)
+            summary_prompt = f"Summarize and ask the user to confirm their vehicle details: VIN: {vin}, Make: {make}, Model: {model}, License Plate: {vehicle.get('license_plate', '-')}"
+            # Stream the summary into one message that grows as the reply arrives
+            fallback = f"Please confirm your vehicle details:\nVIN: {vin}\nMake: {make}\nModel: {model}\nLicense Plate: {vehicle.get('license_plate', '-')}"
+            await send_streamed_message(bot, message.chat.id, stream_bot_response(summary_prompt, fallback=fallback))
 
             # Provide confirmation buttons
             markup = types.InlineKeyboardMarkup()
@@ -76,57 +114,128 @@ def handle_vehicle_photo(bot: TeleBot, message):
                 types.InlineKeyboardButton("✅ Yes", callback_data="confirm_vehicle_yes"),
                 types.InlineKeyboardButton("❌ No", callback_data="confirm_vehicle_no")
             )
-            bot.send_message(message.chat.id, "Are the details correct?", reply_markup=markup)
+            await bot.send_message(message.chat.id, "Are the details correct?", reply_markup=markup)
 
     except Exception as e:
-        print(f"[Vehicle Extraction] Error: {e}")
-        error_prompt = "There was an issue reading your vehicle document. Please upload a clearer image."
-        bot.send_message(message.chat.id, generate_bot_response(error_prompt))
+        log.error("Vehicle extraction failed", user_id=user_id, error=e)
+        await bot.send_message(message.chat.id, await generate_bot_response(VEHICLE_ERROR_PROMPT, cache=True))
+
+
+def _is_usable(value):
+    """True if an OCR field holds an actual value."""
+    return bool(value) and value != "-"
+
 
+def merge_vehicle_data(previous, prediction):
+    """
+    Merges two vehicle OCR results field by field.
+    Each field takes the usable value with the higher OCR confidence.
+    """
+
+    merged = {"confidence": {}}
+    previous_confidence = previous.get("confidence", {})
+    new_confidence = prediction.get("confidence", {})
+
+    for field in Session.VEHICLE_FIELDS:
+        candidates = [
+            (new_confidence.get(field, 0.0), prediction.get(field)),
+            (previous_confidence.get(field, 0.0), previous.get(field)),
+        ]
+        usable = [candidate for candidate in candidates if _is_usable(candidate[1])]
+        confidence, value = max(usable, key=lambda candidate: candidate[0]) if usable else (0.0, "-")
+        merged[field] = value
+        merged["confidence"][field] = confidence
+
+    return merged
+
+
+def check_vin(prediction):
+    """
+    Validates the VIN of an OCR result locally.
+    Returns a copy with the VIN normalized, or blanked out if it is a misread.
+    """
 
-def register_vehicle_callback_handlers(bot: TeleBot):
+    prediction = dict(prediction)
+    if _is_usable(prediction.get("vin")):
+        decoded = decode_vin(prediction["vin"])
+        if decoded["valid"]:
+            prediction["vin"] = decoded["vin"]
+        else:
+            log.info("Rejected invalid VIN", vin=prediction["vin"])
+            prediction["vin"] = "-"
+            prediction["confidence"] = dict(prediction.get("confidence", {}), vin=0.0)
+    return prediction
+
+
+def fill_make_from_vin(vehicle):
+    """Fills in a missing make from the VIN's manufacturer identifier."""
+    if _is_usable(vehicle["vin"]) and not _is_usable(vehicle["make"]):
+        make = decode_vin(vehicle["vin"])["make"]
+        if make:
+            vehicle["make"] = make
+
+
+def has_vin_details(vehicle):
+    """True if the VIN, make and model were all read from the document."""
+    return all(_is_usable(vehicle.get(field)) for field in ("vin", "make", "model"))
+
+
+def register_vehicle_callback_handlers(bot: AsyncTeleBot):
     """
     Registers inline button callbacks for vehicle data confirmation.
     """
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith("confirm_vehicle_"))
-    def handle_vehicle_confirmation(call):
+    @step("vehicle_confirm")
+    async def handle_vehicle_confirmation(call):
         user_id = call.from_user.id
         current_state = get_state(user_id)
 
-        print(f"[Vehicle Handler] Callback received. State: '{current_state}'")
+        log.debug("Callback received", user_id=user_id, state=current_state)
 
         if current_state != "confirm_vehicle":
-            bot.answer_callback_query(call.id, "Unknown request.")
+            await bot.answer_callback_query(call.id, "Unknown request.")
             return
 
         if call.data == "confirm_vehicle_yes":
-            bot.user_data[user_id]["confirmed"] = True
-            bot.answer_callback_query(call.id)
+            set_user_data(user_id, "confirmed", True)
+
+            # Nearly everyone accepts the fixed price: build the policy while they decide
+            policy_prefetch.start(user_id, get_user_data(user_id))
+            await bot.answer_callback_query(call.id)
 
-            bot.edit_message_text(
+            # The confirmation and the price question come from one request
+            messages = await generate_step_messages(
+                {"confirmed": VEHICLE_CONFIRMED_PROMPT, "price": PRICE_PROMPT}, cache=True
+            )
+            await bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=generate_bot_response("The vehicle data has been confirmed. Proceeding to price confirmation.")
+                text=messages["confirmed"]
             )
 
             set_state(user_id, "price_confirmation")
-            print(f"[Vehicle Handler] State set to 'price_confirmation' for user {user_id}")
+            log.debug("Vehicle confirmed", user_id=user_id, state="price_confirmation")
 
             # Import inside to avoid circular imports
             from handlers.price_handler import ask_price_confirmation
-            ask_price_confirmation(bot, call.message)
+            await ask_price_confirmation(bot, call.message, messages["price"])
 
         elif call.data == "confirm_vehicle_no":
-            bot.answer_callback_query(call.id)
-            bot.edit_message_text(
+            await bot.answer_callback_query(call.id)
+
+            # Forget the rejected readings, so a retake of the same photos is read again
+            await get_ocr_cache().invalidate("vehicle", user_id)
+            await bot.edit_message_text(
                 chat_id=call.message.chat.id,
                 message_id=call.message.message_id,
-                text=generate_bot_response("Please re-upload your vehicle document.")
+                text=await generate_bot_response(VEHICLE_REUPLOAD_PROMPT, cache=True)
             )
 
+            # Start the vehicle step over with no leftover fields
+            set_user_data(user_id, "vehicle", {})
             clear_state(user_id)
-            set_state(user_id, "awaiting_vehicle_doc")
-            print(f"[Vehicle Handler] State reset to 'awaiting_vehicle_doc' for user {user_id}")
+            set_state(user_id, "awaiting_vehicle_doc_license_plate")
+            log.debug("Vehicle rejected", user_id=user_id, state="awaiting_vehicle_doc_license_plate")
 
-        bot.answer_callback_query(call.id)  # Dismiss loading spinner
\ No newline at end of file
+        await bot.answer_callback_query(call.id)  # Dismiss loading spinner
\ No newline at end of file
@@ -0,0 +1,184 @@
+# services/mindee_client.py
+
+import asyncio
+import random
+
+import aiohttp
+
+import config
+from utils import deadline
+from utils.circuit_breaker import CircuitBreaker
+from utils.logger import get_logger
+from utils.rate_limiter import outbound
+
+log = get_logger("Mindee Client")
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retry_after(headers, default=1.0):
+    """Seconds from a Retry-After header, or ``default`` if it is missing or not a number."""
+    try:
+        return max(float(headers.get("Retry-After", default)), 0.0)
+    except ValueError:
+        return default
+
+
+class MindeeClient:
+    """
+    Shared HTTP client for all Mindee endpoints.
+
+    - One keep-alive connection pool, so TLS handshakes are reused between uploads and polls
+    - A concurrency limit per endpoint ("passport", "vehicle", "poll")
+    - Explicit connect/read timeouts, and a total timeout per attempt bounded by the step's budget
+    - Bounded retries with full-jitter backoff, limited by a client-wide retry budget
+      so a struggling upstream is not hammered by retry storms
+    - A circuit breaker that refuses requests while Mindee keeps failing
+    """
+
+    def __init__(self, pool_size=None, endpoint_limits=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=0.5, retry_budget=10.0, retry_refill=0.1):
+        self.pool_size = pool_size or config.MINDEE_POOL_SIZE
+        self.endpoint_limits = endpoint_limits or {
+            "passport": config.MINDEE_PASSPORT_CONCURRENCY,
+            "vehicle": config.MINDEE_VEHICLE_CONCURRENCY,
+            "poll": config.MINDEE_POLL_CONCURRENCY,
+        }
+        self.timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=connect_timeout or config.MINDEE_CONNECT_TIMEOUT,
+            sock_read=read_timeout or config.MINDEE_READ_TIMEOUT,
+        )
+        self.max_retries = config.MINDEE_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+
+        # Retry budget: every successful request earns a fraction of a retry
+        self.retry_budget_max = retry_budget
+        self.retry_refill = retry_refill
+        self._retry_tokens = retry_budget
+
+        self._session = None
+        self._semaphores = {}
+
+        # Refuses requests while Mindee keeps failing
+        self.breaker = CircuitBreaker("mindee")
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def _get_semaphore(self, endpoint):
+        if endpoint not in self._semaphores:
+            self._semaphores[endpoint] = asyncio.Semaphore(self.endpoint_limits.get(endpoint, self.pool_size))
+        return self._semaphores[endpoint]
+
+    def _take_retry_token(self):
+        if self._retry_tokens >= 1:
+            self._retry_tokens -= 1
+            return True
+        return False
+
+    def _refill_retry_tokens(self):
+        self._retry_tokens = min(self.retry_budget_max, self._retry_tokens + self.retry_refill)
+
+    def _record_health(self, status, error):
+        """Feeds the outcome of one attempt to the circuit breaker; a timeout caused by our own budget counts for nothing."""
+        if isinstance(error, asyncio.TimeoutError) and deadline.expired():
+            self.breaker.release()
+        elif error is not None or status >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    async def _request(self, endpoint, method, url, api_key, image_bytes=None):
+        headers = {"Authorization": f"Token {api_key}"}
+        session = self._get_session()
+        attempt = 0
+
+        while True:
+            kwargs = {"headers": headers}
+            if image_bytes is not None:
+                # Multipart bodies cannot be re-sent, so rebuild the form on every attempt
+                form = aiohttp.FormData()
+                form.add_field("document", image_bytes, filename="document.jpg", content_type="image/jpeg")
+                kwargs["data"] = form
+
+            self.breaker.check()
+            semaphore = self._get_semaphore(endpoint)
+            try:
+                # Waiting for a connection slot and a rate-limit token counts against the step's budget too
+                await deadline.within(semaphore.acquire())
+                try:
+                    # Status polls are background work; uploads answer a waiting user
+                    await deadline.within(outbound.acquire("mindee", priority="background" if endpoint == "poll" else "interactive"))
+
+                    # An attempt may use no more than what is left of the step's budget
+                    left = deadline.timeout_for()
+                    if left is not None:
+                        kwargs["timeout"] = aiohttp.ClientTimeout(total=left, sock_connect=self.timeout.sock_connect, sock_read=self.timeout.sock_read)
+
+                    async with session.request(method, url, **kwargs) as response:
+                        status = response.status
+                        data = await response.json(content_type=None)
+                        if status == 429:
+                            outbound.pause("mindee", _retry_after(response.headers))
+                finally:
+                    semaphore.release()
+            except deadline.DeadlineExceeded:
+                self.breaker.release()
+                raise
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                status, data, error = None, {}, e
+            else:
+                error = None
+
+            self._record_health(status, error)
+
+            if status is not None and status not in RETRYABLE_STATUSES:
+                self._refill_retry_tokens()
+                return status, data or {}
+
+            attempt += 1
+            delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+            left = deadline.remaining()
+
+            if attempt > self.max_retries or (left is not None and left <= delay) or not self._take_retry_token():
+                if error is not None:
+                    raise error
+                return status, data or {}
+
+            log.info("Retrying request", sample="mindee.retry", endpoint=endpoint, attempt=attempt, max_retries=self.max_retries,
+                     delay=round(delay, 2), status=status, error=error)
+            await asyncio.sleep(delay)
+
+    async def post_document(self, endpoint, url, api_key, image_bytes):
+        """
+        Uploads a document image.
+
+        :return: Tuple (status_code, json_body)
+        """
+        return await self._request(endpoint, "POST", url, api_key, image_bytes=image_bytes)
+
+    async def get_json(self, endpoint, url, api_key):
+        """
+        Fetches a JSON resource such as an async job status.
+
+        :return: Tuple (status_code, json_body)
+        """
+        return await self._request(endpoint, "GET", url, api_key)
+
+    async def close(self):
+        """Closes the connection pool."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Shared client used by the passport and vehicle paths
+mindee_client = MindeeClient()
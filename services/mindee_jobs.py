@@ -0,0 +1,182 @@
+# services/mindee_jobs.py
+
+import asyncio
+import time
+
+import config
+from utils import deadline
+from utils.logger import get_logger
+
+log = get_logger("Mindee Jobs")
+
+
+class VehicleJob:
+    """
+    A single pending Mindee vehicle job and its polling schedule.
+    """
+
+    __slots__ = ("job_id", "polling_url", "api_key", "on_result", "submitted_at", "next_poll_at", "interval", "attempts")
+
+    def __init__(self, job_id, polling_url, api_key, on_result, first_delay):
+        now = time.monotonic()
+        self.job_id = job_id
+        self.polling_url = polling_url
+        self.api_key = api_key
+        self.on_result = on_result
+        self.submitted_at = now
+        self.next_poll_at = now + first_delay
+        self.interval = first_delay
+        self.attempts = 0
+
+
+class VehicleJobTracker:
+    """
+    Polls all pending Mindee vehicle jobs from one background scheduler.
+
+    Each job is polled with exponential backoff, and the first poll is delayed
+    by a running average of how long previous jobs took to complete, so most
+    jobs are answered in one or two requests. When a job finishes the
+    registered ``on_result`` coroutine is launched with the parsed data
+    (or None on failure/timeout).
+    """
+
+    def __init__(self, initial_delay=None, max_interval=None, backoff=None, timeout=None):
+        self.initial_delay = initial_delay or config.MINDEE_POLL_INITIAL_DELAY
+        self.max_interval = max_interval or config.MINDEE_POLL_MAX_INTERVAL
+        self.backoff = backoff or config.MINDEE_POLL_BACKOFF
+        self.timeout = timeout or config.MINDEE_JOB_TIMEOUT
+
+        self._jobs = {}
+        self._wakeup = None
+        self._task = None
+
+        # Polls and result deliveries in flight, by job ID (kept to avoid garbage collection)
+        self._polls = {}
+        self._deliveries = set()
+
+        # Exponentially weighted average of observed job durations
+        self._avg_duration = None
+
+        # Counters for monitoring polling efficiency
+        self.completed = 0
+        self.total_polls = 0
+
+    @property
+    def pending(self):
+        """Number of jobs still waiting for a result."""
+        return len(self._jobs)
+
+    def _first_delay(self):
+        if self._avg_duration is None:
+            return self.initial_delay
+        return min(max(self.initial_delay, self._avg_duration * 0.9), self.max_interval)
+
+    def register(self, job_id, polling_url, api_key, on_result):
+        """Adds a submitted job to the schedule and wakes the scheduler."""
+        self._jobs[job_id] = VehicleJob(job_id, polling_url, api_key, on_result, self._first_delay())
+        log.debug("Registered job", job_id=job_id, pending=self.pending)
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # The scheduler outlives the handler step that registered the first job
+            with deadline.unbounded():
+                self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def stop(self):
+        """Cancels the scheduler task. Pending jobs are dropped."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in self._polls.values():
+            task.cancel()
+        self._polls.clear()
+        self._jobs.clear()
+
+    async def _run(self):
+        while True:
+            if not self._jobs:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            waiting = [job for job in self._jobs.values() if job.job_id not in self._polls]
+
+            # Each poll runs as its own task, so a slow one never holds up the others
+            for job in waiting:
+                if job.next_poll_at <= now:
+                    self._start_poll(job)
+
+            # Sleep until the next job is due, a poll finishes or a new job arrives
+            upcoming = [job.next_poll_at for job in waiting if job.job_id not in self._polls]
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(upcoming) - now if upcoming else None)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start_poll(self, job):
+        task = asyncio.create_task(self._poll(job))
+        self._polls[job.job_id] = task
+        task.add_done_callback(lambda _, job_id=job.job_id: self._poll_done(job_id))
+
+    def _poll_done(self, job_id):
+        self._polls.pop(job_id, None)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _poll(self, job):
+        from services.mindee_service import poll_for_vehicle_result
+
+        job.attempts += 1
+        self.total_polls += 1
+
+        try:
+            status, data = await poll_for_vehicle_result(job.polling_url, job.api_key)
+        except Exception as e:
+            log.warning("Poll error", job_id=job.job_id, error=e)
+            status, data = "processing", None
+
+        log.debug("Polled job", sample="mindee.poll", job_id=job.job_id, attempt=job.attempts, status=status)
+
+        now = time.monotonic()
+
+        if status == "processing":
+            if now - job.submitted_at >= self.timeout:
+                log.warning("Job did not complete in time", job_id=job.job_id, timeout=self.timeout)
+                self._finish(job, None)
+                return
+
+            job.interval = min(job.interval * self.backoff, self.max_interval)
+            job.next_poll_at = now + job.interval
+            return
+
+        if status == "completed":
+            duration = now - job.submitted_at
+            self._avg_duration = duration if self._avg_duration is None else 0.8 * self._avg_duration + 0.2 * duration
+            self.completed += 1
+            log.info("Job completed", job_id=job.job_id, polls=job.attempts, seconds=round(duration, 1))
+
+        self._finish(job, data)
+
+    def _finish(self, job, data):
+        self._jobs.pop(job.job_id, None)
+        # Resume the conversation without holding up the scheduler
+        task = asyncio.create_task(self._deliver(job, data))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, job, data):
+        try:
+            await job.on_result(data)
+        except Exception as e:
+            log.error("Result callback failed", job_id=job.job_id, error=e)
+
+
+# Shared tracker used by the vehicle document flow
+vehicle_jobs = VehicleJobTracker()
@@ -1,33 +1,50 @@
-import requests
+import asyncio
 import json
-import time
+import config
+from services.mindee_client import mindee_client
+from services.ocr_cache import get_ocr_cache, OcrCache
+from utils.logger import get_logger
+from utils.metrics import span
 
-def extract_passport_data(image_bytes, api_key):
+log = get_logger("Mindee")
+
+
+async def extract_passport_data(image_bytes, api_key, cache_scope=None):
     """
     Sends a passport image to the Mindee API for data extraction.
-    Returns the full JSON response if successful, or None on failure.
+    Returns only the fields used by the conversation, or None on failure.
+    Results for the same (or, within cache_scope, a nearly identical) image
+    are served from the OCR cache.
     
     :param image_bytes: Image file in bytes
     :param api_key: Mindee API key
-    :return: Parsed JSON response or None
+    :param cache_scope: Owner of the image (user id) for near-duplicate matching
+    :return: Dictionary with surname, given_names, birth_date or None
     """
 
-    url = "https://api.mindee.net/v1/products/mindee/passport/v1/predict"
-    headers = {"Authorization": f"Token {api_key}"}
-    files = {"document": image_bytes}
+    url = f"{config.MINDEE_API_URL}/v1/products/mindee/passport/v1/predict"
 
     # Check for missing API key
     if not api_key:
-        print("[Mindee] Error: API Key is missing")
+        log.error("API key is missing")
         return None
 
+    with span("ocr_cache_lookup", "passport") as timed:
+        fingerprint = await asyncio.to_thread(OcrCache.fingerprint, image_bytes)
+        cached = await get_ocr_cache().lookup("passport", fingerprint, cache_scope)
+        timed.outcome = "miss" if cached is None else "hit"
+    if cached is not None:
+        log.debug("OCR cache hit", kind="passport")
+        return cached
+
     try:
-        # Send request to Mindee Passport API
-        response = requests.post(url, headers=headers, files=files)
-        print(f"[Mindee] Status Code: {response.status_code}")
+        # Send request to Mindee Passport API over the shared connection pool
+        with span("mindee_submit", "passport") as timed:
+            status_code, data = await mindee_client.post_document("passport", url, api_key, image_bytes)
+            timed.outcome = _outcome(status_code, 201)
+        log.debug("Passport submitted", status=status_code)
 
-        if response.status_code == 201:
-            data = response.json()
+        if status_code == 201:
             prediction = (
                 data.get("document", {})
                 .get("inference", {})
@@ -37,118 +54,160 @@ def extract_passport_data(image_bytes, api_key):
             # Validate that at least the surname was found
             surname_data = prediction.get("surname", {})
             if not surname_data.get("value"):
-                print("[Mindee] Error: No valid surname found in prediction")
+                log.warning("No valid surname found in prediction")
                 return None
 
-            return data  # Return full response for flexibility
+            # Keep only the fields the flow needs instead of the full response
+            result = {
+                "surname": surname_data["value"],
+                "given_names": (prediction.get("given_names") or [{}])[0].get("value", "-"),
+                "birth_date": prediction.get("birth_date", {}).get("value", "-"),
+            }
+            await get_ocr_cache().store("passport", fingerprint, result, cache_scope)
+            return result
         else:
-            error_msg = response.json().get("api_request", {}).get("error", {}).get("message", "Unknown error")
-            print(f"[Mindee] API Error: {error_msg}")
+            error_msg = data.get("api_request", {}).get("error", {}).get("message", "Unknown error")
+            log.error("Passport API error", status=status_code, error=error_msg)
             return None
     except Exception as e:
-        print(f"[Mindee] Network/Error: {e}")
+        log.error("Passport request failed", error=e)
         return None
 
 
-def extract_vehicle_data(image_bytes, api_key):
+async def extract_vehicle_data(image_bytes, api_key, on_result, cache_scope=None):
     """
     Submits a vehicle document to Mindee for async processing.
-    Waits for result by polling and returns structured vehicle data.
+    The returned polling URL is registered with the background job tracker,
+    which calls ``on_result`` with the structured vehicle data (or None) once
+    the job finishes. The caller is never blocked while Mindee is working.
+    On an OCR cache hit no job is submitted and ``on_result`` is called right away.
 
     :param image_bytes: Image file in bytes
     :param api_key: Mindee API key
-    :return: Dictionary with extracted vehicle info or None
+    :param on_result: Coroutine function receiving the vehicle data dict or None
+    :param cache_scope: Owner of the image (user id) for near-duplicate matching
+    :return: Job ID (or a "cache:" ID on a cache hit) if accepted, otherwise None
     """
 
-    url = "https://api.mindee.net/v1/products/Whylek/vehicle_registration/v1/predict_async"
-    headers = {"Authorization": f"Token {api_key}"}
-    files = {"document": image_bytes}
+    url = f"{config.MINDEE_API_URL}/v1/products/Whylek/vehicle_registration/v1/predict_async"
 
     if not api_key:
-        print("[Mindee Vehicle] Error: API Key is missing")
+        log.error("API key is missing")
         return None
 
+    with span("ocr_cache_lookup", "vehicle") as timed:
+        fingerprint = await asyncio.to_thread(OcrCache.fingerprint, image_bytes)
+        cached = await get_ocr_cache().lookup("vehicle", fingerprint, cache_scope)
+        timed.outcome = "miss" if cached is None else "hit"
+    if cached is not None:
+        log.debug("OCR cache hit", kind="vehicle")
+        await on_result(cached)
+        return f"cache:{fingerprint[0][:12]}"
+
+    # Cache successful results before handing them to the caller
+    async def cache_and_deliver(data):
+        if data:
+            await get_ocr_cache().store("vehicle", fingerprint, data, cache_scope)
+        await on_result(data)
+
     try:
         # Submit the document for async processing
-        response = requests.post(url, headers=headers, files=files)
-        print(f"[Mindee Vehicle] Submit Status Code: {response.status_code}")
-
-        if response.status_code != 202:
-            error_msg = response.json().get("api_request", {}).get("error", {}).get("message", "Unknown error")
-            print(f"[Mindee Vehicle] API Error: {error_msg}")
+        with span("mindee_submit", "vehicle") as timed:
+            status_code, job_data = await mindee_client.post_document("vehicle", url, api_key, image_bytes)
+            timed.outcome = _outcome(status_code, 202)
+        log.debug("Vehicle document submitted", status=status_code)
+
+        if status_code != 202:
+            error_msg = job_data.get("api_request", {}).get("error", {}).get("message", "Unknown error")
+            log.error("Vehicle API error", status=status_code, error=error_msg)
             return None
 
         # Extract job ID and polling URL from response
-        job_data = response.json()
         job_id = job_data.get("job", {}).get("id")
         polling_url = job_data.get("job", {}).get("polling_url")
 
         if not job_id or not polling_url:
-            print("[Mindee Vehicle] Error: No job ID or polling URL returned")
+            log.error("No job ID or polling URL returned")
             return None
 
-        # Poll for result until completion or timeout
-        return poll_for_vehicle_result(polling_url, api_key)
+        # Hand the job over to the shared scheduler instead of polling here
+        from services.mindee_jobs import vehicle_jobs
+        vehicle_jobs.register(job_id, polling_url, api_key, cache_and_deliver)
+        return job_id
 
     except Exception as e:
-        print(f"[Mindee Vehicle] Network/Error: {e}")
+        log.error("Vehicle request failed", error=e)
         return None
 
 
-def poll_for_vehicle_result(polling_url, api_key):
+def _outcome(status_code, expected):
+    """Span outcome for a Mindee response: "ok" or the unexpected HTTP status."""
+    return "ok" if status_code == expected else f"http_{status_code}"
+
+
+def parse_vehicle_prediction(data):
+    """
+    Extracts the vehicle fields from a completed Mindee job document.
+
+    :param data: JSON body of a completed polling response
+    :return: Dictionary with vin, license_plate, make, model and their
+             per-field OCR confidences under "confidence"
     """
-    Polls the given URL periodically to check the status of an async vehicle document job.
-    Returns parsed vehicle data when available.
+
+    prediction = (
+        data.get("document", {})
+        .get("inference", {})
+        .get("prediction", {})
+    )
+
+    # Map our field names to Mindee's prediction keys
+    field_keys = {
+        "vin": "vehicle_identification_number",
+        "license_plate": "license_plate_number",
+        "make": "vehicle_make",
+        "model": "vehicle_model",
+    }
+
+    # Retrieve vehicle fields with their confidences
+    result = {"confidence": {}}
+    for field, key in field_keys.items():
+        value = prediction.get(key) or {}
+        result[field] = value.get("value") or "-"
+        result["confidence"][field] = value.get("confidence") or 0.0
+
+    return result
+
+
+async def poll_for_vehicle_result(polling_url, api_key):
+    """
+    Checks the status of an async vehicle document job once.
+    Scheduling and retries are owned by ``services.mindee_jobs``.
 
     :param polling_url: URL provided by initial async call
     :param api_key: Mindee API key
-    :return: Dictionary with vin, license_plate, make, model or None
+    :return: Tuple (status, data) where status is "completed", "processing" or "failed"
+             and data is the parsed vehicle dictionary for completed jobs
     """
 
-    headers = {"Authorization": f"Token {api_key}"}
-
-    max_attempts = 30     # Max number of polling attempts
-    poll_interval = 3     # Seconds between each attempt
-
-    for attempt in range(max_attempts):
-        response = requests.get(polling_url, headers=headers)
-        print(f"[Mindee Vehicle] Polling Attempt {attempt + 1} - Status Code: {response.status_code}")
-
-        if response.status_code == 200:
-            status_data = response.json()
-            job_status = status_data.get("job", {}).get("status")
-
-            if job_status == "completed":
-                # Extract inference data
-                data = status_data
-                prediction = (
-                    data.get("document", {})
-                    .get("inference", {})
-                    .get("prediction", {})
-                )
-
-                # Retrieve vehicle fields
-                vin = prediction.get("vehicle_identification_number", {}).get("value", "-")
-                license_plate = prediction.get("license_plate_number", {}).get("value", "-")
-                make = prediction.get("vehicle_make", {}).get("value", "-")
-                model = prediction.get("vehicle_model", {}).get("value", "-")
-
-                return {
-                    "vin": vin,
-                    "license_plate": license_plate,
-                    "make": make,
-                    "model": model,
-                }
-
-            elif job_status == "failed":
-                print("[Mindee Vehicle] Error: Job failed")
-                return None
+    with span("mindee_poll", "vehicle") as timed:
+        status_code, status_data = await mindee_client.get_json("poll", polling_url, api_key)
+        timed.outcome = _outcome(status_code, 200)
 
-        elif response.status_code == 404:
-            print("[Mindee Vehicle] Polling Error: Resource not found")
-            return None
+    if status_code == 200:
+        job_status = status_data.get("job", {}).get("status")
+
+        if job_status == "completed":
+            return "completed", parse_vehicle_prediction(status_data)
+
+        elif job_status == "failed":
+            log.warning("Vehicle job failed")
+            return "failed", None
+
+        return "processing", None
 
-        time.sleep(poll_interval)
+    elif status_code == 404:
+        log.warning("Vehicle job not found", url=polling_url)
+        return "failed", None
 
-    print("[Mindee Vehicle] Error: Job did not complete within the maximum attempts")
-    return None
\ No newline at end of file
+    # Transient errors (429, 5xx) are retried by the scheduler
+    return "processing", None
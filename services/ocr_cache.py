@@ -0,0 +1,170 @@
+# services/ocr_cache.py
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+import config
+from utils.logger import get_logger
+
+log = get_logger("OCR Cache")
+
+
+def perceptual_hash(image_bytes):
+    """
+    Computes a 64-bit difference hash (dHash) of an image.
+    Re-encoded, resized or slightly recompressed copies of a photo get the same
+    or a very close hash.
+    """
+
+    image = Image.open(BytesIO(image_bytes)).convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _hamming(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+class OcrCache:
+    """
+    On-disk cache of OCR results keyed by image content.
+
+    A lookup first matches the exact SHA-256 of the image bytes. Failing that,
+    it matches the perceptual hash within ``max_distance`` bits. Both only
+    consider entries of the same scope (the same user), so a similar-looking
+    document of another person is never returned, and a result one user
+    rejected (invalidate) cannot come back through another user's entry.
+    Entries expire after ``ttl`` seconds and the oldest ones are dropped
+    beyond ``max_entries``.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None, max_distance=None):
+        self.ttl = ttl or config.OCR_CACHE_TTL
+        self.max_entries = max_entries or config.OCR_CACHE_MAX_ENTRIES
+        self.max_distance = config.OCR_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "kind TEXT NOT NULL, sha256 TEXT NOT NULL, phash INTEGER, scope TEXT, "
+            "data TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (kind, sha256))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_scope ON ocr_cache (kind, scope)")
+        self._conn.commit()
+
+        # Hit/miss counters for monitoring
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(image_bytes):
+        """Returns (sha256, perceptual hash or None) for the image bytes."""
+        sha256 = hashlib.sha256(image_bytes).hexdigest()
+        try:
+            phash = perceptual_hash(image_bytes)
+        except Exception:
+            phash = None
+        return sha256, phash
+
+    def _lookup(self, kind, sha256, phash, scope):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM ocr_cache WHERE kind = ? AND sha256 = ? AND scope IS ? AND created_at >= ?",
+                (kind, sha256, None if scope is None else str(scope), cutoff),
+            ).fetchone()
+
+            if row is None and phash is not None and scope is not None:
+                candidates = self._conn.execute(
+                    "SELECT phash, data FROM ocr_cache WHERE kind = ? AND scope = ? AND phash IS NOT NULL AND created_at >= ?",
+                    (kind, str(scope), cutoff),
+                ).fetchall()
+                best = min(candidates, key=lambda c: _hamming(c[0], phash), default=None)
+                if best is not None and _hamming(best[0], phash) <= self.max_distance:
+                    row = (best[1],)
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def _store(self, kind, sha256, phash, scope, data):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (kind, sha256, phash, scope, data, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, sha256, phash, None if scope is None else str(scope), json.dumps(data, ensure_ascii=False), now),
+            )
+            # Enforce TTL and size bound
+            self._conn.execute("DELETE FROM ocr_cache WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM ocr_cache WHERE rowid IN ("
+                "SELECT rowid FROM ocr_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def lookup(self, kind, fingerprint, scope=None):
+        """Returns the cached result for an image fingerprint, or None."""
+        return await asyncio.to_thread(self._lookup, kind, fingerprint[0], fingerprint[1], scope)
+
+    async def store(self, kind, fingerprint, data, scope=None):
+        """Caches an OCR result for an image fingerprint."""
+        try:
+            await asyncio.to_thread(self._store, kind, fingerprint[0], fingerprint[1], scope, data)
+        except Exception as e:
+            log.warning("Could not store result", error=e)
+
+    def _invalidate(self, kind, scope):
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM ocr_cache WHERE kind = ? AND scope = ?", (kind, str(scope))).rowcount
+
+    async def invalidate(self, kind, scope):
+        """Drops all results of a kind cached for a scope, e.g. after the user rejected the data read from their photo."""
+        try:
+            removed = await asyncio.to_thread(self._invalidate, kind, scope)
+            log.debug("Invalidated results", kind=kind, removed=removed)
+        except Exception as e:
+            log.warning("Could not invalidate results", error=e)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Shared cache used by the Mindee service, opened on first use so that
+# processes which merely import this module (PDF workers) leave the database alone
+_ocr_cache = None
+_ocr_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """Returns the shared OCR cache, opening its database on first use."""
+    global _ocr_cache
+    if _ocr_cache is None:
+        with _ocr_cache_lock:
+            if _ocr_cache is None:
+                _ocr_cache = OcrCache(config.OCR_CACHE_PATH)
+    return _ocr_cache
+
+
+def close_ocr_cache():
+    """Closes the shared OCR cache if it was opened."""
+    if _ocr_cache is not None:
+        _ocr_cache.close()
@@ -1,29 +1,91 @@
 # services/openai_service.py
 
-from openai import OpenAI
+import asyncio
+import json
+import time
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError
 from config import OPENAI_API_KEY
+from services.prompts import STATIC_PROMPTS, FALLBACK_REPLIES
+from services.response_cache import ResponseCache
+from services.single_flight import SingleFlight
+from services.policy_template import SECTION_TITLES, assemble_policy, policy_fields, render_policy_sections
+from utils import deadline
+from utils.circuit_breaker import CircuitBreaker
+from utils.logger import get_logger
+from utils.metrics import metrics, span
+from utils.rate_limiter import outbound
+import config
 
-# Initialize the OpenAI client with the API key from config
-client = OpenAI(api_key=OPENAI_API_KEY)
+log = get_logger("OpenAI")
 
-def generate_bot_response(prompt: str) -> str:
-    """
-    Generates a chatbot response based on the user's input prompt.
-    Uses a predefined system message to maintain consistent behavior.
-    """
+# Initialize the asynchronous OpenAI client with the API key from config
+client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=config.OPENAI_TIMEOUT, max_retries=config.OPENAI_MAX_RETRIES)
 
-    # System prompt defines the bot's role and purpose
-    system_prompt = """
+# Refuses OpenAI calls while the API keeps failing
+openai_breaker = CircuitBreaker("openai")
+
+# System prompt defines the bot's role and purpose
+SYSTEM_PROMPT = """
 You are a friendly and professional insurance agent named 'Whylek_insurance'. 
 You help users complete their car insurance purchase process. 
 Always respond in English.
 """
 
-    # Send the prompt to OpenAI and get the response
-    response = client.chat.completions.create(
-        model="gpt-4.1-nano",
+# Model used for conversational replies
+BOT_MODEL = "gpt-4.1-nano"
+
+# Appended to the system prompt when several messages of one step are generated together
+STEP_INSTRUCTIONS = """
+You will receive a JSON object mapping message names to instructions.
+Write one chat message for each instruction, in order, as they will be sent one after another.
+Reply with a JSON object that maps every message name to the text of that message.
+"""
+
+# Model used to personalise policy sections
+POLICY_MODEL = "gpt-3.5-turbo"
+
+# Cache of replies to static prompts
+response_cache = ResponseCache(
+    variants=config.RESPONSE_CACHE_VARIANTS,
+    ttl=config.RESPONSE_CACHE_TTL,
+    max_keys=config.RESPONSE_CACHE_MAX_KEYS,
+)
+
+# Background tasks that top up cache pools, by cache key (kept to avoid garbage collection)
+_refill_tasks = {}
+
+# Identical concurrent requests share one upstream call
+response_flights = SingleFlight(max_fanout=config.LLM_MAX_FANOUT)
+
+
+def _is_upstream_failure(error):
+    """True for errors that say OpenAI is unhealthy, as opposed to a rejected request or our own budget running out."""
+    if isinstance(error, TimeoutError):
+        return not deadline.expired()
+    return isinstance(error, (APIConnectionError, InternalServerError, httpx.TransportError))
+
+
+async def _create_completion(**kwargs):
+    """
+    Sends one chat completion request through the rate limiter and the circuit
+    breaker, bounded by the time left in the step's budget (at most config.OPENAI_TIMEOUT).
+    """
+
+    await deadline.within(outbound.acquire("openai"))
+    timeout = deadline.timeout_for(config.OPENAI_TIMEOUT)
+    with openai_breaker.guard(_is_upstream_failure):
+        # The client's own retries happen within the same timeout
+        return await asyncio.wait_for(client.chat.completions.create(timeout=timeout, **kwargs), timeout)
+
+
+async def _complete_bot_response(prompt: str) -> str:
+    """Sends the prompt to OpenAI and returns the generated text."""
+
+    response = await _create_completion(
+        model=BOT_MODEL,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ]
     )
@@ -32,68 +94,331 @@ Always respond in English.
     return response.choices[0].message.content
 
 
-def generate_insurance_policy(user_data: dict) -> str:
+async def stream_bot_response(prompt: str, fallback: str = None):
     """
-    Generates a formal car insurance policy document using user data.
-    Extracts personal and vehicle details from user_data dictionary.
+    Yields the reply to the prompt in fragments as OpenAI streams it.
+    Not cached or coalesced: intended for replies to prompts with user data,
+    shown with utils.streaming.send_streamed_message.
+
+    If the stream fails before its first fragment (over budget, circuit open,
+    upstream error), ``fallback`` is yielded instead when given. A stream still
+    running when the step's budget is spent is cut short.
     """
 
-    # Extract passport data
-    passport = user_data.get("passport", {})
-    surname = passport.get("surname", "SURNAME")
-    given_names = passport.get("given_names", ["Name"])
-    first_name = given_names[0] if len(given_names) > 0 else "Name"
-    full_name = f"{first_name} {surname}"
+    started = time.perf_counter()
+    stream = None
+    first = True
+    with span("llm_stream") as timed:
+        try:
+            stream = await _create_completion(
+                model=BOT_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True
+            )
+            chunks = aiter(stream)
+            while True:
+                # Each read is bounded by what is left of the step's budget
+                try:
+                    chunk = await deadline.within(anext(chunks))
+                except StopAsyncIteration:
+                    break
+                except deadline.DeadlineExceeded:
+                    if first:
+                        raise
+                    log.warning("Stream over budget, cutting the reply short")
+                    timed.outcome = "truncated"
+                    yield "…"
+                    break
 
-    # Date of birth
-    dob = passport.get("birth_date", "01.01.1990")
+                piece = chunk.choices[0].delta.content if chunk.choices else None
+                if piece:
+                    if first:
+                        metrics.observe("llm_first_token", time.perf_counter() - started, metrics.current_step())
+                        first = False
+                    yield piece
+        except Exception as e:
+            # Failures while reading the stream happen outside the request's breaker guard
+            if stream is not None and _is_upstream_failure(e):
+                openai_breaker.record_failure()
+            if fallback is None or not first:
+                raise
+            log.warning("Streaming unavailable, using fallback text", error=e)
+            timed.outcome = "fallback_text"
+            yield fallback
+        finally:
+            if stream is not None:
+                await stream.close()
 
-    # Extract vehicle data
-    vehicle = user_data.get("vehicle", {})
-    vin = vehicle.get("vin", "VIN1234567890XYZ")
-    license_plate = vehicle.get("license_plate", "ABC123")
-    make = vehicle.get("make", "Toyota")  
-    model = vehicle.get("model", "Camry") 
 
-    # Build the prompt for generating the insurance policy
+async def _complete_step_messages(prompts: dict) -> dict:
+    """
+    Sends several prompts to OpenAI as one JSON-mode request.
+    Returns the replies by prompt name; names the model left out are missing.
+    """
+
+    response = await _create_completion(
+        model=BOT_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT + STEP_INSTRUCTIONS},
+            {"role": "user", "content": json.dumps(prompts, ensure_ascii=False)}
+        ],
+        response_format={"type": "json_object"}
+    )
+
+    replies = json.loads(response.choices[0].message.content)
+    return {
+        name: replies[name].strip()
+        for name in prompts
+        if isinstance(replies.get(name), str) and replies[name].strip()
+    }
+
+
+async def _shared_completion(key: str, prompt: str, timed) -> str:
+    """
+    Completes the prompt, joining an identical request already in flight if there is one.
+    A caller that joins waits no longer than its own budget allows.
+    """
+    if response_flights.joinable(key):
+        timed.outcome = "coalesced"
+    return await deadline.within(response_flights.run(key, lambda: _complete_bot_response(prompt)), config.OPENAI_TIMEOUT)
+
+
+def _fallback_reply(prompt: str, error: Exception, timed) -> str:
+    """
+    Pre-written reply to a static prompt, used when the LLM failed, is over
+    budget or its circuit is open. Re-raises ``error`` for other prompts.
+    """
+    if prompt not in FALLBACK_REPLIES:
+        raise error
+    log.warning("LLM unavailable, using fallback reply", error=error)
+    timed.outcome = "fallback_text"
+    return FALLBACK_REPLIES[prompt]
+
+
+async def _refill_cache(key: str, prompt: str):
+    """Generates one more reply variant for a cached prompt."""
+    try:
+        with outbound.priority("background"), deadline.unbounded():
+            response_cache.add(key, prompt, await _complete_bot_response(prompt))
+    except Exception as e:
+        log.warning("Cache refill failed", error=e)
+
+
+def _schedule_refill(key: str, prompt: str):
+    """
+    Tops up a prompt's variant pool in the background if it is not full yet.
+    At most as many refills per prompt run at once as its pool lacks replies.
+    """
+    if len(_refill_tasks.get(key, ())) >= response_cache.missing(key) or openai_breaker.is_open:
+        return
+
+    task = asyncio.create_task(_refill_cache(key, prompt))
+    _refill_tasks.setdefault(key, set()).add(task)
+    task.add_done_callback(lambda task, key=key: _forget_refill(key, task))
+
+
+def _forget_refill(key: str, task):
+    tasks = _refill_tasks.get(key)
+    if tasks is not None:
+        tasks.discard(task)
+        if not tasks:
+            del _refill_tasks[key]
+
+
+async def generate_bot_response(prompt: str, cache: bool = False) -> str:
+    """
+    Generates a chatbot response based on the user's input prompt.
+    Uses a predefined system message to maintain consistent behavior.
+
+    With cache=True (only for prompts that do not contain user data) the reply
+    is served from the response cache. While a prompt has fewer than the
+    configured number of variants, a new one is generated in the background.
+    Concurrent calls with the same prompt share one upstream request.
+    If the LLM does not answer within the step's budget, fails or its circuit
+    is open, static prompts get their pre-written fallback reply.
+    """
+
+    with span("llm_response") as timed:
+        key = ResponseCache.make_key(SYSTEM_PROMPT, prompt, BOT_MODEL)
+        cached = response_cache.get(key) if cache else None
+
+        if cached is not None:
+            timed.outcome = "cached"
+            _schedule_refill(key, prompt)
+            return cached
+
+        try:
+            reply = await _shared_completion(key, prompt, timed)
+        except Exception as e:
+            return _fallback_reply(prompt, e, timed)
+
+        if cache:
+            response_cache.add(key, prompt, reply)
+        return reply
+
+
+async def generate_step_messages(prompts: dict, cache: bool = False) -> dict:
+    """
+    Generates all chatbot messages of one conversation step with at most one request.
+
+    :param prompts: Ordered mapping of message name -> prompt
+    :param cache: Serve and store replies through the response cache (static prompts only)
+    :return: Mapping of message name -> reply text, in the order of ``prompts``
+
+    Cached replies are used as they are. The remaining prompts are answered together
+    in one JSON-mode request. Any message missing from that reply, or all of them
+    if the request fails, is generated with a separate request as a fallback.
+    Messages the LLM cannot answer in time get their pre-written fallback reply.
+    """
+
+    with span("llm_step") as timed:
+        replies = {}
+        keys = {}
+
+        if cache:
+            for name, prompt in prompts.items():
+                keys[name] = ResponseCache.make_key(SYSTEM_PROMPT, prompt, BOT_MODEL)
+                cached = response_cache.get(keys[name])
+                if cached is not None:
+                    replies[name] = cached
+                    _schedule_refill(keys[name], prompt)
+
+        missing = {name: prompt for name, prompt in prompts.items() if name not in replies}
+        if not missing:
+            timed.outcome = "cached"
+            return replies
+
+        generated = {}
+        if len(missing) > 1:
+            try:
+                step_key = ResponseCache.make_key(SYSTEM_PROMPT + STEP_INSTRUCTIONS, json.dumps(missing), BOT_MODEL)
+                generated = dict(await deadline.within(response_flights.run(step_key, lambda: _complete_step_messages(missing)), config.OPENAI_TIMEOUT))
+            except Exception as e:
+                log.warning("Combined step request failed", messages=list(missing), error=e)
+
+        fallback = [name for name in missing if name not in generated]
+        if fallback:
+            if len(missing) > 1:
+                timed.outcome = "fallback"
+            results = await asyncio.gather(*(
+                _shared_completion(keys.get(name) or ResponseCache.make_key(SYSTEM_PROMPT, missing[name], BOT_MODEL), missing[name], timed)
+                for name in fallback
+            ), return_exceptions=True)
+            for name, result in zip(fallback, results):
+                if isinstance(result, BaseException):
+                    replies[name] = _fallback_reply(missing[name], result, timed)
+                else:
+                    generated[name] = result
+
+        if cache:
+            for name in generated:
+                response_cache.add(keys[name], missing[name], generated[name])
+
+        replies.update(generated)
+        return {name: replies[name] for name in prompts}
+
+
+async def warm_up_response_cache(concurrency: int = 4):
+    """
+    Restores the cache snapshot from disk and fills every static prompt's pool
+    up to the configured number of variants. Intended to run as a background
+    task at startup.
+    """
+
+    loaded = response_cache.load(config.RESPONSE_CACHE_PATH)
+    log.info("Loaded cached prompts from snapshot", prompts=loaded)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fill(prompt):
+        key = ResponseCache.make_key(SYSTEM_PROMPT, prompt, BOT_MODEL)
+
+        # Bounded, since identical replies are not added to the pool
+        for _ in range(response_cache.variants * 2):
+            if not response_cache.needs_more(key):
+                return
+            async with semaphore:
+                try:
+                    response_cache.add(key, prompt, await _complete_bot_response(prompt))
+                except Exception as e:
+                    log.warning("Cache warm-up failed for prompt", error=e)
+                    return
+
+    # Warm-up must not hold up replies to users arriving at the same time
+    with outbound.priority("background"), deadline.unbounded():
+        await asyncio.gather(*(fill(prompt) for prompt in STATIC_PROMPTS))
+    save_response_cache()
+    log.info("Cache warm-up complete")
+
+
+def save_response_cache():
+    """Writes the response cache snapshot to disk."""
+    try:
+        response_cache.save(config.RESPONSE_CACHE_PATH)
+    except OSError as e:
+        log.warning("Could not save cache snapshot", error=e)
+
+
+async def _enrich_section(key: str, text: str, full_name: str) -> str:
+    """Asks the LLM to personalise one policy section without changing its facts."""
+
     prompt = f"""
-You are a professional legal writer. Generate a clear, formal, and professional **Car Insurance Policy Document** using the information provided below. The document should resemble a real policy and include standard sections such as:
-
-1. **Policy Summary**
-2. **Policy Holder Details**
-3. **Vehicle Information**
-4. **Coverage Details** (you may use standard placeholders)
-5. **Terms and Conditions** (brief, formal)
-6. **Claims Process**
-7. **Contact Information**
-
-Use clear headings and maintain a professional tone throughout. Do not invent specific personal details beyond what is provided.
-
-### Policy Holder Information:
-- **Full Name:** {full_name}
-- **Date of Birth:** {dob}
-- **License Plate Number:** {license_plate}
-- **Vehicle Identification Number (VIN):** {vin}
-- **Vehicle Make:** {make}
-- **Vehicle Model:** {model}
-
-**Contact Information:**
-+380679342672  
-support@insurancecompany.com  
-221B Baker Street, London  
-
-**[Whylek_insurance]**  
-*Safe travels with peace of mind.*
+Rewrite the "{SECTION_TITLES[key]}" section of a car insurance policy for the policy holder {full_name}.
+Keep a clear, formal and professional tone. Keep every fact, number and name exactly as given
+and do not invent new details. Return plain text only, one paragraph per line, without headings.
+
+{text}
 """
 
-    # Send request to OpenAI to generate the policy
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
+    response = await _create_completion(
+        model=POLICY_MODEL,
         messages=[
             {"role": "system", "content": "You are an assistant that generates realistic insurance policies."},
             {"role": "user", "content": prompt}
         ]
     )
 
-    # Return the generated insurance policy text
-    return response.choices[0].message.content
\ No newline at end of file
+    return response.choices[0].message.content.strip()
+
+
+async def generate_insurance_policy(user_data: dict) -> str:
+    """
+    Generates a formal car insurance policy document using user data.
+    All standard sections are rendered locally from templates. Sections listed in
+    config.POLICY_ENRICH_SECTIONS are additionally personalised by the LLM, and fall
+    back to the template text if the LLM does not answer within config.POLICY_LLM_BUDGET.
+    """
+
+    with span("policy_text") as timed:
+        sections = render_policy_sections(user_data)
+        enrich_keys = [key for key in config.POLICY_ENRICH_SECTIONS if key in sections]
+
+        if enrich_keys:
+            full_name = policy_fields(user_data)["full_name"]
+            tasks = {
+                key: asyncio.create_task(_enrich_section(key, sections[key], full_name))
+                for key in enrich_keys
+            }
+
+            # Wait for all enrichments together, bounded by a single time budget
+            done, pending = await asyncio.wait(tasks.values(), timeout=config.POLICY_LLM_BUDGET)
+            for task in pending:
+                task.cancel()
+
+            for key, task in tasks.items():
+                if task in done and not task.exception() and task.result():
+                    sections[key] = task.result()
+                else:
+                    log.info("Using template text for policy section", section=key)
+                    timed.outcome = "fallback"
+
+    # Return the assembled insurance policy text
+    return assemble_policy(sections)
+
+
+async def close_openai_client():
+    """Closes the underlying HTTP connection pool of the OpenAI client."""
+    await client.close()
@@ -0,0 +1,98 @@
+# services/pdf_service.py
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from utils.metrics import span
+from utils.pdf_generator import render_pdf
+
+
+def _worker_context():
+    """
+    Start method for worker processes. Workers are forked from a fork server
+    that has preloaded the PDF generator, so they do not inherit the event
+    loop and open sockets. Like spawned processes they still import the
+    bot's entry module as __mp_main__, and with it every module it imports;
+    that is why bot.py wires things up only in main(), and the session store,
+    OCR cache and log writer thread are only created when first used there.
+    Falls back to "spawn" where fork servers are not available.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["utils.pdf_generator"])
+    return context
+
+
+class PdfServiceBusy(Exception):
+    """Raised when the render queue is full and a new job cannot be accepted."""
+
+
+class PdfRenderService:
+    """
+    Renders policy PDFs in a bounded pool of worker processes.
+
+    ReportLab rendering is CPU-bound and holds the GIL, so it runs outside the
+    event loop process. At most ``workers`` documents render at once; up to
+    ``max_queue`` more wait for a free worker, and further requests are
+    rejected with PdfServiceBusy (back-pressure).
+    """
+
+    def __init__(self, workers=None, max_queue=None):
+        self.workers = workers or config.PDF_WORKERS
+        self.max_queue = config.PDF_MAX_QUEUE if max_queue is None else max_queue
+
+        self._executor = None
+        self._slots = None
+
+        # Gauges
+        self.queue_depth = 0  # requests waiting for a free worker
+        self.in_flight = 0    # documents currently rendering
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_worker_context())
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._executor
+
+    async def render(self, text: str) -> bytes:
+        """Renders the policy text and returns the PDF bytes."""
+
+        with span("pdf_render") as timed:
+            try:
+                return await self._render(text)
+            except PdfServiceBusy:
+                timed.outcome = "busy"
+                raise
+
+    async def _render(self, text):
+        executor = self._get_executor()
+
+        if self._slots.locked() and self.queue_depth >= self.max_queue:
+            raise PdfServiceBusy(f"PDF render queue is full ({self.queue_depth} waiting)")
+
+        self.queue_depth += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queue_depth -= 1
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, render_pdf, text)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def shutdown(self):
+        """Stops the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared rendering service used by the policy handler
+pdf_service = PdfRenderService()
@@ -0,0 +1,110 @@
+# services/policy_prefetch.py
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+
+import config
+from services.openai_service import generate_insurance_policy
+from services.pdf_service import pdf_service
+from utils import deadline
+from utils.logger import get_logger
+from utils.metrics import span
+from utils.rate_limiter import outbound
+
+log = get_logger("Policy Prefetch")
+
+
+def _data_key(user_data):
+    """Digest of the data a policy is built from, to detect changes after the prefetch started."""
+    return hashlib.sha1(json.dumps(user_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class PolicyPrefetcher:
+    """
+    Builds policy PDFs speculatively, before the user has agreed to the price.
+
+    Each user has at most one slot holding the background task that produces
+    the PDF bytes. The slot is taken when the user agrees, dropped when they
+    disagree, and expires after ``ttl`` seconds. At most ``max_slots`` slots
+    are kept; the oldest is dropped first.
+    """
+
+    def __init__(self, ttl=None, max_slots=None):
+        self.ttl = ttl or config.POLICY_PREFETCH_TTL
+        self.max_slots = max_slots or config.POLICY_PREFETCH_MAX_SLOTS
+        self._slots = OrderedDict()  # user_id -> (data key, task, expiry timer)
+
+        # Counters for monitoring how often the speculation pays off
+        self.hits = 0
+        self.misses = 0
+
+    async def _build(self, user_id, user_data):
+        try:
+            # Runs past the step that started it, so the step's budget does not apply,
+            # and is speculative, so it gives way to live replies at the rate limiters
+            with span("policy_prefetch"), deadline.unbounded(), outbound.priority("background"):
+                policy_text = await generate_insurance_policy(user_data)
+                return await pdf_service.render(policy_text)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Prefetch failed", user_id=user_id, error=e)
+            return None
+
+    def start(self, user_id, user_data):
+        """Starts building the policy for the user's current data in the background."""
+
+        self.discard(user_id)
+        while len(self._slots) >= self.max_slots:
+            self.discard(next(iter(self._slots)))
+
+        task = asyncio.create_task(self._build(user_id, user_data))
+        timer = asyncio.get_running_loop().call_later(self.ttl, self.discard, user_id)
+        self._slots[user_id] = (_data_key(user_data), task, timer)
+        log.debug("Prefetch started", user_id=user_id, slots=len(self._slots))
+
+    def take(self, user_id, user_data):
+        """
+        Removes and returns the user's prefetch task (resolving to PDF bytes or None).
+        Returns None if there is no slot or the data changed since it was started.
+        """
+
+        slot = self._slots.pop(user_id, None)
+        if slot is None:
+            self.misses += 1
+            return None
+
+        data_key, task, timer = slot
+        timer.cancel()
+        if data_key != _data_key(user_data):
+            task.cancel()
+            self.misses += 1
+            log.info("Discarded prefetch for changed data", user_id=user_id)
+            return None
+
+        self.hits += 1
+        return task
+
+    def discard(self, user_id):
+        """Cancels and drops the user's prefetch, if any."""
+        slot = self._slots.pop(user_id, None)
+        if slot is not None:
+            _, task, timer = slot
+            timer.cancel()
+            task.cancel()
+
+    def clear(self):
+        """Drops all prefetches (on shutdown)."""
+        for user_id in list(self._slots):
+            self.discard(user_id)
+
+    @property
+    def pending(self):
+        """Number of users with a prefetched or in-progress policy held."""
+        return len(self._slots)
+
+
+# Shared prefetcher used by the vehicle, price and policy handlers
+policy_prefetch = PolicyPrefetcher()
@@ -0,0 +1,126 @@
+# services/policy_template.py
+
+import hashlib
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+# Company details printed in every policy
+COMPANY_NAME = "Whylek_insurance"
+CONTACT_PHONE = "+380679342672"
+CONTACT_EMAIL = "support@insurancecompany.com"
+CONTACT_ADDRESS = "221B Baker Street, London"
+
+# Fixed premium offered in the price step
+PREMIUM_USD = 100
+
+# Section keys and headings, in the order they appear in the document
+SECTIONS = (
+    ("summary", "1. Policy Summary"),
+    ("holder", "2. Policy Holder Details"),
+    ("vehicle", "3. Vehicle Information"),
+    ("coverage", "4. Coverage Details"),
+    ("terms", "5. Terms and Conditions"),
+    ("claims", "6. Claims Process"),
+    ("contact", "7. Contact Information"),
+)
+
+SECTION_TITLES = dict(SECTIONS)
+
+
+def policy_fields(user_data: dict) -> dict:
+    """
+    Extracts the personal and vehicle details used in the policy from user_data.
+    Missing values fall back to neutral placeholders.
+    """
+
+    # Extract passport data
+    passport = user_data.get("passport", {})
+    surname = passport.get("surname", "SURNAME")
+    given_names = passport.get("given_names", ["Name"])
+    first_name = given_names[0] if len(given_names) > 0 else "Name"
+
+    # Extract vehicle data
+    vehicle = user_data.get("vehicle", {})
+
+    return {
+        "full_name": f"{first_name} {surname}",
+        "dob": passport.get("birth_date", "01.01.1990"),
+        "vin": vehicle.get("vin", "VIN1234567890XYZ"),
+        "license_plate": vehicle.get("license_plate", "ABC123"),
+        "make": vehicle.get("make", "Toyota"),
+        "model": vehicle.get("model", "Camry"),
+    }
+
+
+def _policy_number(fields: dict, start: date) -> str:
+    """Builds a stable policy number from the holder, vehicle and start date."""
+    digest = hashlib.sha1(f"{fields['full_name']}|{fields['vin']}|{start.isoformat()}".encode("utf-8")).hexdigest()
+    return f"WI-{start:%Y%m%d}-{digest[:8].upper()}"
+
+
+def render_policy_sections(user_data: dict, today: date = None) -> dict:
+    """
+    Renders every standard policy section from user_data.
+    Returns a dict of section key -> section body (plain text, one paragraph per line).
+    """
+
+    fields = {key: str(value) for key, value in policy_fields(user_data).items()}
+    start = today or date.today()
+    end = start + timedelta(days=365)
+    policy_number = _policy_number(fields, start)
+
+    return {
+        "summary": (
+            f"Policy Number: {policy_number}\n"
+            f"Policy Period: {start:%d.%m.%Y} to {end:%d.%m.%Y}\n"
+            f"Annual Premium: ${PREMIUM_USD}.00 (paid in full)\n"
+            f"This policy provides motor insurance cover for the vehicle described below, "
+            f"issued by {COMPANY_NAME} to {fields['full_name']}."
+        ),
+        "holder": (
+            f"Full Name: {fields['full_name']}\n"
+            f"Date of Birth: {fields['dob']}"
+        ),
+        "vehicle": (
+            f"Make: {fields['make']}\n"
+            f"Model: {fields['model']}\n"
+            f"License Plate Number: {fields['license_plate']}\n"
+            f"Vehicle Identification Number (VIN): {fields['vin']}"
+        ),
+        "coverage": (
+            "Third-Party Liability: bodily injury and property damage caused to third parties, up to the statutory limits.\n"
+            "Collision: damage to the insured vehicle resulting from a collision, subject to the deductible.\n"
+            "Comprehensive: theft, fire, vandalism and natural hazards, subject to the deductible.\n"
+            "Deductible: [Deductible amount as stated in the schedule]"
+        ),
+        "terms": (
+            "This policy is valid only for the vehicle and policy holder stated above.\n"
+            "The policy holder must provide accurate information; misrepresentation may void the cover.\n"
+            "Cover does not apply to use of the vehicle for racing, hire or reward, or by unlicensed drivers.\n"
+            "Either party may cancel this policy in accordance with applicable law."
+        ),
+        "claims": (
+            "Report any incident to us as soon as reasonably possible, and no later than 30 days after it occurs.\n"
+            "Provide the policy number, a description of the incident, photographs and any police report.\n"
+            "A claims handler will contact you to assess the damage and agree on the settlement."
+        ),
+        "contact": (
+            f"Phone: {CONTACT_PHONE}\n"
+            f"Email: {CONTACT_EMAIL}\n"
+            f"Address: {CONTACT_ADDRESS}\n"
+            f"[{COMPANY_NAME}] Safe travels with peace of mind."
+        ),
+    }
+
+
+def assemble_policy(sections: dict) -> str:
+    """
+    Joins rendered sections into the final policy text in document order.
+    Section bodies are escaped here, once, for the PDF's paragraph markup.
+    """
+
+    parts = []
+    for key, title in SECTIONS:
+        parts.append(f"<b>{title}</b>")
+        parts.append(escape(sections[key]))
+    return "\n".join(parts)
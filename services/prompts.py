@@ -0,0 +1,75 @@
+# services/prompts.py
+
+# Fixed prompts sent to generate_bot_response at each step of the conversation.
+# They do not depend on user data, so their replies can be cached and pre-generated.
+
+# Start
+WELCOME_PROMPT = "The user has started the bot. Welcome them and ask to send their passport photo to begin the insurance process."
+START_INSTRUCTION_PROMPT = "Ask the user to send a photo of their passport to proceed with the car insurance application."
+
+# Passport
+PASSPORT_PROCESSING_PROMPT = "The user has uploaded a passport photo. Please confirm that you are now processing the document."
+PASSPORT_ERROR_PROMPT = "There was an issue reading the passport. Please upload a clearer image."
+PASSPORT_CONFIRMED_PROMPT = "The passport data has been confirmed. Please send a clear photo of the front page of your vehicle registration certificate, where the license plate number is visible."
+PASSPORT_REUPLOAD_PROMPT = "Please re-upload your passport photo."
+
+# Vehicle
+VEHICLE_VIN_REQUEST_PROMPT = "Please upload a photo with the VIN code and make of the vehicle."
+VEHICLE_ERROR_PROMPT = "There was an issue reading your vehicle document. Please upload a clearer image."
+VEHICLE_CONFIRMED_PROMPT = "The vehicle data has been confirmed. Proceeding to price confirmation."
+VEHICLE_REUPLOAD_PROMPT = "Please re-upload your vehicle document."
+
+# Price
+PRICE_PROMPT = "Inform the user about the fixed insurance price of $100 and ask if they agree to proceed."
+PRICE_AGREED_PROMPT = "The user has agreed to the price. Generating the insurance policy now."
+PRICE_FIXED_PROMPT = "Unfortunately, the price of $100 is fixed and cannot be changed. Would you like to proceed with the purchase?"
+
+# Policy
+POLICY_READY_PROMPT = "Inform the user that the insurance policy is ready and they can review it in the attached file."
+
+# Reminders for non-photo messages during upload steps
+REMINDER_PROMPTS = {
+    "awaiting_passport": "Please upload a clear photo of your passport.",
+    "awaiting_vehicle_doc_license_plate": "Please upload a clear photo of the vehicle's license plate.",
+    "awaiting_vehicle_doc_vin": "Please upload a clear photo with the vehicle's VIN code and make/model.",
+}
+
+# Every static prompt, used to warm up the response cache at startup
+STATIC_PROMPTS = (
+    WELCOME_PROMPT,
+    START_INSTRUCTION_PROMPT,
+    PASSPORT_PROCESSING_PROMPT,
+    PASSPORT_ERROR_PROMPT,
+    PASSPORT_CONFIRMED_PROMPT,
+    PASSPORT_REUPLOAD_PROMPT,
+    VEHICLE_VIN_REQUEST_PROMPT,
+    VEHICLE_ERROR_PROMPT,
+    VEHICLE_CONFIRMED_PROMPT,
+    VEHICLE_REUPLOAD_PROMPT,
+    PRICE_PROMPT,
+    PRICE_AGREED_PROMPT,
+    PRICE_FIXED_PROMPT,
+    POLICY_READY_PROMPT,
+    *REMINDER_PROMPTS.values(),
+)
+
+# Pre-written replies sent instead when the LLM is over budget, failing or its circuit is open
+FALLBACK_REPLIES = {
+    WELCOME_PROMPT: "Welcome to Whylek_insurance! I'll help you buy car insurance in a few minutes. To begin, please send a photo of your passport.",
+    START_INSTRUCTION_PROMPT: "Please send a photo of your passport to continue with your car insurance application.",
+    PASSPORT_PROCESSING_PROMPT: "Thank you! I'm processing your passport now, this will take a moment.",
+    PASSPORT_ERROR_PROMPT: "Sorry, I couldn't read your passport. Please upload a clearer photo.",
+    PASSPORT_CONFIRMED_PROMPT: "Thank you, your passport details are confirmed. Now please send a clear photo of the front page of your vehicle registration certificate, with the license plate number visible.",
+    PASSPORT_REUPLOAD_PROMPT: "No problem. Please upload your passport photo again.",
+    VEHICLE_VIN_REQUEST_PROMPT: "Please upload a photo showing the VIN code and the make of your vehicle.",
+    VEHICLE_ERROR_PROMPT: "Sorry, I couldn't read your vehicle document. Please upload a clearer photo.",
+    VEHICLE_CONFIRMED_PROMPT: "Thank you, your vehicle details are confirmed. Let's move on to the price.",
+    VEHICLE_REUPLOAD_PROMPT: "No problem. Please upload your vehicle document again.",
+    PRICE_PROMPT: "The price of your car insurance is $100. Do you agree to proceed?",
+    PRICE_AGREED_PROMPT: "Great, thank you! I'm generating your insurance policy now.",
+    PRICE_FIXED_PROMPT: "I'm sorry, the price of $100 is fixed and cannot be changed. Would you like to proceed with the purchase?",
+    POLICY_READY_PROMPT: "Your insurance policy is ready. You can review it in the attached file.",
+    REMINDER_PROMPTS["awaiting_passport"]: "Please upload a clear photo of your passport.",
+    REMINDER_PROMPTS["awaiting_vehicle_doc_license_plate"]: "Please upload a clear photo of your vehicle's license plate.",
+    REMINDER_PROMPTS["awaiting_vehicle_doc_vin"]: "Please upload a clear photo showing your vehicle's VIN code and make/model.",
+}
@@ -0,0 +1,108 @@
+# services/response_cache.py
+
+import hashlib
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+
+from utils.logger import get_logger
+
+log = get_logger("Response Cache")
+
+
+class ResponseCache:
+    """
+    In-memory cache of LLM replies for static prompts.
+
+    Each key (system prompt, user prompt, model) holds a pool of up to
+    ``variants`` different replies, so repeated steps still vary a little.
+    Keys expire after ``ttl`` seconds and the least recently used key is
+    evicted once ``max_keys`` is reached. The cache can be snapshotted to
+    and restored from a JSON file.
+    """
+
+    def __init__(self, variants=3, ttl=86400, max_keys=256):
+        self.variants = variants
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key -> {"prompt": ..., "replies": [...], "created_at": ...}
+
+        # Hit/miss counters for monitoring
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(system_prompt, prompt, model):
+        """Builds a stable cache key from the request parameters."""
+        raw = json.dumps([system_prompt, prompt, model], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key):
+        """Returns a random cached reply for the key, or None."""
+        entry = self._live_entry(key)
+        if not entry or not entry["replies"]:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return random.choice(entry["replies"])
+
+    def needs_more(self, key):
+        """True if the key's pool holds fewer than ``variants`` replies."""
+        return self.missing(key) > 0
+
+    def missing(self, key):
+        """Number of replies the key's pool still lacks."""
+        entry = self._live_entry(key)
+        return self.variants - (len(entry["replies"]) if entry else 0)
+
+    def add(self, key, prompt, reply):
+        """Adds a reply to the key's pool, evicting old keys if needed."""
+        entry = self._live_entry(key)
+        if entry is None:
+            entry = {"prompt": prompt, "replies": [], "created_at": time.time()}
+            self._entries[key] = entry
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+        if len(entry["replies"]) < self.variants and reply not in entry["replies"]:
+            entry["replies"].append(reply)
+
+    def save(self, path):
+        """Writes a snapshot of all live entries to a JSON file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(self._entries), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Restores entries from a JSON snapshot, skipping expired ones."""
+        if not os.path.exists(path):
+            return 0
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("Could not load snapshot", path=path, error=e)
+            return 0
+
+        now = time.time()
+        for key, entry in snapshot.items():
+            if now - entry.get("created_at", 0) <= self.ttl:
+                self._entries[key] = entry
+
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+        return len(self._entries)
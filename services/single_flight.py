@@ -0,0 +1,69 @@
+# services/single_flight.py
+
+import asyncio
+
+from utils import deadline
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 1
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one.
+
+    While a call for a key is in flight, further callers with the same key
+    wait for its result instead of starting their own. At most
+    ``max_fanout`` callers share one call; the next caller starts a new one.
+    The shared call is shielded, so a caller that gives up does not cancel
+    it for the others, and runs without the leader's deadline.
+    """
+
+    def __init__(self, max_fanout=100):
+        self.max_fanout = max_fanout
+        self._flights = {}
+
+        # Calls started vs. calls answered by joining one already in flight
+        self.leaders = 0
+        self.followers = 0
+
+    def joinable(self, key):
+        """True if a call for ``key`` would join one already in flight."""
+        flight = self._flights.get(key)
+        return flight is not None and flight.waiters < self.max_fanout
+
+    async def run(self, key, func):
+        """Returns the result of ``func()``, sharing it with concurrent callers of the same key."""
+
+        flight = self._flights.get(key)
+        if flight is not None and flight.waiters < self.max_fanout:
+            flight.waiters += 1
+            self.followers += 1
+        else:
+            # The shared call must not end with the leader's budget; every caller bounds its own wait
+            with deadline.unbounded():
+                flight = _Flight(asyncio.create_task(func()))
+            self._flights[key] = flight
+            self.leaders += 1
+            flight.task.add_done_callback(lambda task, key=key, flight=flight: self._forget(key, flight, task))
+
+        return await asyncio.shield(flight.task)
+
+    def _forget(self, key, flight, task):
+        # A full flight may already have been replaced by a newer one for the same key
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Mark a failure as retrieved even if every caller has given up
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def coalescing_ratio(self):
+        """Share of calls answered by joining another caller's request."""
+        total = self.leaders + self.followers
+        return self.followers / total if total else 0.0
@@ -0,0 +1,104 @@
+# utils/circuit_breaker.py
+
+import asyncio
+import time
+from contextlib import contextmanager
+
+import config
+from utils.logger import get_logger
+
+log = get_logger("Circuit Breaker")
+
+
+class CircuitOpenError(Exception):
+    """The upstream is failing and calls to it are refused until the breaker resets."""
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream is unhealthy.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and every
+    call is refused with CircuitOpenError. After ``reset_timeout`` seconds one
+    trial call is let through (half-open): its success closes the breaker, its
+    failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.BREAKER_FAILURES
+        self.reset_timeout = reset_timeout or config.BREAKER_RESET_TIMEOUT
+
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+        # Number of times the breaker has opened
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @property
+    def is_open(self):
+        """True while calls are being refused."""
+        return self.state == "open" or self._probing
+
+    def check(self):
+        """Raises CircuitOpenError unless a call may go out now."""
+        if self._opened_at is None:
+            return
+        if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self._probing = True  # This call is the trial
+
+    def record_success(self):
+        if self._opened_at is not None:
+            log.info("Circuit closed", upstream=self.name)
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def release(self):
+        """Ends a trial call that proved nothing either way, so the next call is the trial."""
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+            if not self._probing:
+                self.trips += 1
+                log.warning("Circuit opened", upstream=self.name, failures=self._failures)
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    @contextmanager
+    def guard(self, is_failure=lambda error: True):
+        """
+        Checks the breaker, then records the outcome of the enclosed call.
+        Exceptions for which ``is_failure`` is false count as a healthy answer,
+        except timeouts, which say nothing either way (the caller's own budget ran out).
+        """
+
+        self.check()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # A cancelled trial proves nothing; let the next call try again
+            self.release()
+            raise
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            elif isinstance(e, TimeoutError):
+                self.release()
+            else:
+                self.record_success()
+            raise
+        else:
+            self.record_success()
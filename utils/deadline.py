@@ -0,0 +1,106 @@
+# utils/deadline.py
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import config
+
+# Monotonic time by which the current handler step must be done (None: no limit)
+_deadline = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The step's latency budget is spent before an external call could be made."""
+
+
+def parse_budgets(spec):
+    """Parses "step=seconds,step=seconds" into a dictionary."""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, seconds = item.partition("=")
+        budgets[name.strip()] = float(seconds)
+    return budgets
+
+
+_step_budgets = parse_budgets(config.STEP_BUDGETS)
+
+
+def step_budget(step):
+    """Latency budget in seconds of a funnel step."""
+    return _step_budgets.get(step, config.STEP_BUDGET)
+
+
+@contextmanager
+def budget(seconds):
+    """
+    Limits the enclosed block, and tasks started in it, to ``seconds``.
+    An enclosing budget that ends earlier still applies.
+    """
+
+    ends = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(ends if current is None else min(current, ends))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def unbounded():
+    """Lifts the deadline for background work started from a handler (prefetches, cache refills, pollers)."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or None if there is none."""
+    ends = _deadline.get()
+    return None if ends is None else ends - time.monotonic()
+
+
+def expired():
+    """True if the current budget is spent."""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def timeout_for(limit=None):
+    """
+    Timeout for one external call: the time left in the budget, capped at ``limit``.
+    Raises DeadlineExceeded if nothing is left; returns None if neither applies.
+    """
+
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        raise DeadlineExceeded("Step budget exhausted")
+    return left if limit is None else min(left, limit)
+
+
+async def within(awaitable, limit=None):
+    """
+    Awaits ``awaitable`` for no longer than the time left in the budget (capped
+    at ``limit``). Raises DeadlineExceeded once the budget is spent, or
+    TimeoutError if only ``limit`` ran out.
+    """
+
+    try:
+        timeout = timeout_for(limit)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except TimeoutError:
+        if expired():
+            raise DeadlineExceeded("Step budget exhausted") from None
+        raise
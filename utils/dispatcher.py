@@ -0,0 +1,177 @@
+# utils/dispatcher.py
+
+import asyncio
+import time
+from collections import deque
+
+import config
+from utils.logger import get_logger
+
+log = get_logger("Dispatcher")
+
+
+def update_user_key(update):
+    """Returns the id of the user an update belongs to (or a unique key if there is none)."""
+    for field in ("message", "edited_message", "callback_query"):
+        event = getattr(update, field, None)
+        if event is not None and getattr(event, "from_user", None) is not None:
+            return event.from_user.id
+    return ("update", update.update_id)
+
+
+class UserDispatcher:
+    """
+    Runs work in per-user serial queues on a bounded global worker pool.
+
+    Jobs submitted for the same user run one after another in arrival order,
+    so two quick photos cannot race on the user's state. Jobs of different
+    users run in parallel, up to ``workers`` at a time, so one slow OCR job
+    does not starve unrelated users. Once ``max_queued`` jobs are waiting in
+    total, the dispatcher is full: polling stops fetching updates until a job
+    starts, and the webhook server refuses them.
+    """
+
+    def __init__(self, workers=None, max_queued=None):
+        self.workers = workers or config.DISPATCH_WORKERS
+        self.max_queued = max_queued or config.DISPATCH_MAX_QUEUE
+
+        self._queues = {}      # user key -> deque of (enqueued_at, job)
+        self._slots = None
+        self._tasks = set()
+        self._queued = 0       # jobs waiting in all queues
+        self._capacity = None  # set while the dispatcher is not full
+        self._process_update = None  # the bot's own update processing, once installed
+
+        # Metrics
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, key, job):
+        """
+        Queues a job for a user.
+
+        :param key: User id (or any hashable key) that defines the ordering
+        :param job: Zero-argument coroutine function
+        """
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._capacity = asyncio.Event()
+            self._capacity.set()
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            task = asyncio.create_task(self._drain(key, queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.append((time.monotonic(), job))
+        self._queued += 1
+        if self.full:
+            self._capacity.clear()
+
+    @property
+    def full(self):
+        """True while ``max_queued`` or more jobs are waiting."""
+        return self._queued >= self.max_queued
+
+    async def wait_for_capacity(self):
+        """Waits until the dispatcher is no longer full."""
+        while self.full:
+            await self._capacity.wait()
+
+    async def _drain(self, key, queue):
+        try:
+            while queue:
+                async with self._slots:
+                    # A job counts as queued until a worker takes it
+                    enqueued_at, job = queue.popleft()
+                    self._queued -= 1
+                    if not self.full:
+                        self._capacity.set()
+                    wait = time.monotonic() - enqueued_at
+                    self.processed += 1
+                    self.total_wait += wait
+                    self.max_wait = max(self.max_wait, wait)
+                    try:
+                        await job()
+                    except Exception as e:
+                        log.error("Job failed", key=key, error=e)
+        finally:
+            # No await between the empty check and removal, so no job can be lost
+            self._queues.pop(key, None)
+
+    def stats(self):
+        """Returns queue depth, active users and wait-time figures in seconds."""
+        return {
+            "queue_depth": self._queued,
+            "active_users": len(self._queues),
+            "processed": self.processed,
+            "avg_wait": self.total_wait / self.processed if self.processed else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    def install(self, bot, prepare=None):
+        """
+        Routes every update received by the bot through the per-user queues.
+        While the dispatcher is full, new updates wait for a free place; use
+        poll() rather than the bot's own polling, which does not wait.
+
+        :param prepare: Optional coroutine function awaited with the user id
+            before each of the user's updates is processed
+        """
+
+        process_new_updates = bot.process_new_updates
+
+        async def process_update(key, update):
+            if prepare is not None and not isinstance(key, tuple):
+                await prepare(key)
+            await process_new_updates([update])
+
+        self._process_update = process_update
+
+        async def dispatch_updates(updates):
+            for update in updates:
+                await self.wait_for_capacity()
+                self._queue_update(update)
+
+        bot.process_new_updates = dispatch_updates
+
+    def _queue_update(self, update):
+        key = update_user_key(update)
+        self.submit(key, lambda: self._process_update(key, update))
+
+    async def poll(self, bot, timeout=20):
+        """
+        Long-polls Telegram for updates and queues them, until cancelled.
+
+        Replaces the bot's own polling loop, which hands every batch to a
+        detached task and moves on. Here the next batch is only requested
+        when there is room for it, and the offset (which tells Telegram an
+        update has been received) only moves past updates already queued,
+        so a full dispatcher leaves new updates waiting on Telegram's side.
+        """
+
+        offset = None
+        error_interval = 0.25
+        while True:
+            await self.wait_for_capacity()
+            limit = min(100, self.max_queued - self._queued)
+            try:
+                updates = await bot.get_updates(offset=offset, limit=limit, timeout=timeout)
+            except Exception as e:
+                log.error("Polling failed", error=e)
+                await asyncio.sleep(error_interval)
+                error_interval = min(error_interval * 2, 30)
+                continue
+            error_interval = 0.25
+
+            for update in updates:
+                await self.wait_for_capacity()
+                self._queue_update(update)
+                offset = update.update_id + 1
+
+
+# Shared dispatcher for incoming updates and background continuations
+dispatcher = UserDispatcher()
@@ -0,0 +1,100 @@
+# utils/image_preprocess.py
+
+import asyncio
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageOps
+
+import config
+from utils.logger import get_logger
+from utils.metrics import span
+
+log = get_logger("Image Preprocess")
+
+# Total size of the images handed to prepare_for_ocr and of what is uploaded instead, for /metrics
+ocr_image_bytes = {"before": 0, "after": 0}
+
+
+def pick_photo_size(photos, target_side=None):
+    """
+    Picks the smallest Telegram PhotoSize whose shorter side reaches the target.
+    Falls back to the largest size when none is big enough.
+    """
+
+    target_side = target_side or config.OCR_TARGET_SIDE
+    candidates = [photo for photo in photos if min(photo.width, photo.height) >= target_side]
+    if not candidates:
+        return photos[-1]
+    return min(candidates, key=lambda photo: photo.width * photo.height)
+
+
+def _crop_margins(image, padding=10, threshold=30):
+    """Crops uniform borders around the document, keeping a small padding."""
+
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background).convert("L")
+    # Suppress JPEG noise so near-background pixels do not count as content
+    bbox = diff.point(lambda value: 255 if value > threshold else 0).getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    bbox = (max(left - padding, 0), max(top - padding, 0),
+            min(right + padding, image.width), min(bottom + padding, image.height))
+
+    # Only crop when it removes a noticeable margin
+    cropped_area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+    if cropped_area > 0.95 * image.width * image.height:
+        return image
+    return image.crop(bbox)
+
+
+def preprocess_image(image_bytes, max_side=None, max_bytes=None, quality=None):
+    """
+    Prepares a document photo for OCR upload: auto-orients it from EXIF data,
+    crops plain margins, downscales it so the longer side is at most max_side,
+    and re-encodes it as a JPEG no larger than max_bytes (lowering quality if needed).
+
+    :return: JPEG bytes, or the original bytes if they are already smaller
+    """
+
+    max_side = max_side or config.OCR_MAX_SIDE
+    max_bytes = max_bytes or config.OCR_MAX_BYTES
+    quality = quality or config.OCR_JPEG_QUALITY
+
+    image = Image.open(BytesIO(image_bytes))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image = _crop_margins(image)
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    while True:
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= max_bytes or quality <= 50:
+            break
+        quality -= 10
+
+    result = buffer.getvalue()
+    return result if len(result) < len(image_bytes) else image_bytes
+
+
+async def prepare_for_ocr(image_bytes, label="image"):
+    """
+    Runs preprocess_image off the event loop and records the size before and
+    after (ocr_image_bytes). Returns the original bytes if preprocessing fails.
+    """
+
+    with span("image_preprocess") as timed:
+        try:
+            processed = await asyncio.to_thread(preprocess_image, image_bytes)
+        except Exception as e:
+            timed.outcome = "kept_original"
+            log.warning("Kept original image", label=label, error=e)
+            processed = image_bytes
+
+    ocr_image_bytes["before"] += len(image_bytes)
+    ocr_image_bytes["after"] += len(processed)
+    log.debug("Image prepared", label=label, bytes_in=len(image_bytes), bytes_out=len(processed))
+    return processed
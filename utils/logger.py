@@ -0,0 +1,218 @@
+# utils/logger.py
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+from aiohttp import web
+
+import config
+
+# Keys whose values are personal data; they are masked wherever they appear in log fields
+REDACTED_FIELDS = frozenset({
+    "surname", "given_names", "birth_date", "full_name",
+    "vin", "license_plate", "passport", "vehicle", "user_data", "prediction",
+})
+
+_ROOT = "bot"
+_root_logger = logging.getLogger(_ROOT)
+_root_logger.propagate = False
+
+# Sampling rates for high-frequency events, keyed by the ``sample`` name passed to a log call
+_sample_rates = {}
+
+_listener = None
+_queue_handler = None
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread as they are.
+    Formatting happens on the writer thread, and records are dropped (and
+    counted) instead of blocking when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders a record and its fields as one line of "key=value" text or JSON, redacting personal data."""
+
+    def __init__(self, fmt="text", redact=True):
+        super().__init__()
+        self.fmt = fmt
+        self.redact = redact
+
+    def _clean(self, key, value):
+        if self.redact and key in REDACTED_FIELDS and value not in (None, "", "-"):
+            return "<redacted>"
+        if isinstance(value, dict):
+            return {k: self._clean(k, v) for k, v in value.items()}
+        if isinstance(value, BaseException):
+            return f"{type(value).__name__}: {value}"
+        return value
+
+    def format(self, record):
+        fields = {key: self._clean(key, value) for key, value in getattr(record, "fields", {}).items()}
+        tag = record.name[len(_ROOT) + 1:] or _ROOT
+
+        if self.fmt == "json":
+            entry = {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": tag,
+                "msg": record.getMessage(),
+                **fields,
+            }
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        line = f"{timestamp} {record.levelname:<7} [{tag}] {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={_text_value(value)}" for key, value in fields.items())
+        return line
+
+
+def _text_value(value):
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return f'"{text}"' if isinstance(value, str) and (" " in text or not text) else text
+
+
+class StructuredLogger:
+    """
+    Leveled logger that takes a message plus keyword fields.
+
+    The level check and sampling decision happen in the caller; formatting,
+    redaction and the write happen on the background writer thread.
+    """
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(f"{_ROOT}.{name}")
+
+    def _log(self, level, message, sample, fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        if sample is not None:
+            rate = _sample_rates.get(sample, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return
+        self._logger.log(level, message, extra={"fields": fields})
+
+    def debug(self, message, *, sample=None, **fields):
+        self._log(logging.DEBUG, message, sample, fields)
+
+    def info(self, message, *, sample=None, **fields):
+        self._log(logging.INFO, message, sample, fields)
+
+    def warning(self, message, *, sample=None, **fields):
+        self._log(logging.WARNING, message, sample, fields)
+
+    def error(self, message, *, sample=None, **fields):
+        self._log(logging.ERROR, message, sample, fields)
+
+
+def parse_sampling(spec):
+    """Parses "event=rate,event=rate" into a dictionary of rates between 0 and 1."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        key, _, rate = item.partition("=")
+        rates[key.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def set_level(level):
+    """Changes the minimum level of all bot loggers at runtime."""
+    setup_logging()
+    _root_logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def set_sample_rate(key, rate):
+    """Changes the fraction of ``sample=key`` log calls that are kept (1 keeps all)."""
+    setup_logging()
+    _sample_rates[key] = min(max(float(rate), 0.0), 1.0)
+
+
+def logging_settings():
+    """Returns the current level, sampling rates and number of dropped records."""
+    return {
+        "level": logging.getLevelName(_root_logger.level),
+        "sampling": dict(_sample_rates),
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
+
+
+def setup_logging(level=None, fmt=None, sampling=None, redact=None, queue_size=None, stream=None):
+    """
+    Starts the background writer thread; called by the entry point (bot.main).
+    Until then only warnings reach stderr, so processes that merely import
+    the bot's modules (PDF workers) start no thread.
+    """
+
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    formatter = StructuredFormatter(fmt or config.LOG_FORMAT, config.LOG_REDACT if redact is None else redact)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size or config.LOG_QUEUE_SIZE)
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    _root_logger.addHandler(_queue_handler)
+    _root_logger.setLevel((level or config.LOG_LEVEL).upper())
+    _sample_rates.update(parse_sampling(config.LOG_SAMPLING if sampling is None else sampling))
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Writes out queued records and stops the writer thread."""
+
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _root_logger.removeHandler(_queue_handler)
+    _listener = None
+
+
+def get_logger(name):
+    """Returns the structured logger for a component, e.g. get_logger("Mindee")."""
+    return StructuredLogger(name)
+
+
+async def handle_logging_settings(request: web.Request) -> web.Response:
+    """
+    Shows (GET) or changes (POST) the logging settings at runtime, e.g.
+    POST /logging?level=DEBUG&sample=mindee.poll=0.5
+    """
+
+    if request.method == "POST":
+        try:
+            if "level" in request.query:
+                set_level(request.query["level"])
+            for key, rate in parse_sampling(request.query.get("sample")).items():
+                set_sample_rate(key, rate)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+    return web.json_response(logging_settings())
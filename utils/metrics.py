@@ -0,0 +1,215 @@
+# utils/metrics.py
+
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiohttp import web
+
+from utils import deadline
+from utils.logger import get_logger
+
+log = get_logger("Metrics")
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Funnel step of the update being handled, used when a span does not name its own
+_current_step = ContextVar("metrics_step", default="-")
+
+
+class Span:
+    """One timed operation; handlers may override the outcome before it ends."""
+
+    __slots__ = ("name", "step", "outcome")
+
+    def __init__(self, name, step):
+        self.name = name
+        self.step = step
+        self.outcome = "ok"
+
+
+class Histogram:
+    """Cumulative latency histogram for one label set."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """
+    In-process metrics in the Prometheus text format.
+
+    Spans are aggregated into one histogram family keyed by span name, funnel
+    step and outcome; waits for outbound rate-limit tokens into a second one
+    keyed by service, funnel step and priority class. Gauges are callbacks
+    read at scrape time, so components such as the PDF pool or the
+    dispatcher keep their own counters.
+    """
+
+    def __init__(self, prefix="bot", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._histograms = {}        # (span, step, outcome) -> Histogram
+        self._queue_histograms = {}  # (service, step, priority) -> Histogram
+        self._gauges = []            # (name, help, type, callback)
+        self._lock = threading.Lock()
+
+    def _record(self, histograms, key, seconds):
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram.counts[i] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def observe(self, name, seconds, step="-", outcome="ok"):
+        """Records the duration of one operation."""
+        self._record(self._histograms, (name, step, outcome), seconds)
+
+    def observe_queue(self, service, seconds, step="-", priority="interactive"):
+        """Records how long an outbound call waited for a rate-limit token."""
+        self._record(self._queue_histograms, (service, step, priority), seconds)
+
+    @contextmanager
+    def span(self, name, step=None):
+        """
+        Times the enclosed block.
+        The outcome is whatever the block assigned to ``span.outcome``, else
+        "ok", "error" if it raises or "cancelled" if its task is cancelled.
+        """
+
+        record = Span(name, step or _current_step.get())
+        started = time.perf_counter()
+        try:
+            yield record
+        except asyncio.CancelledError:
+            record.outcome = "cancelled"
+            raise
+        except Exception:
+            if record.outcome == "ok":
+                record.outcome = "error"
+            raise
+        finally:
+            self.observe(record.name, time.perf_counter() - started, record.step, record.outcome)
+
+    def step(self, name):
+        """
+        Decorator for async handlers: tags every span inside the handler with
+        the funnel step ``name``, times the handler itself as a "handler" span
+        and gives its external calls the step's latency budget.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                token = _current_step.set(name)
+                try:
+                    with self.span("handler", name), deadline.budget(deadline.step_budget(name)):
+                        return await func(*args, **kwargs)
+                finally:
+                    _current_step.reset(token)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def current_step():
+        """Funnel step of the handler currently running ("-" outside handlers)."""
+        return _current_step.get()
+
+    def totals(self):
+        """Returns (span, step, outcome, count, total seconds) for every label set, largest total first."""
+        return self._totals(self._histograms)
+
+    def queue_totals(self):
+        """Returns (service, step, priority, count, total seconds) of outbound queue waits, largest total first."""
+        return self._totals(self._queue_histograms)
+
+    def _totals(self, histograms):
+        with self._lock:
+            rows = [(*key, h.count, h.sum) for key, h in histograms.items()]
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+    def gauge(self, name, help_text, callback, metric_type="gauge"):
+        """Registers a value read from ``callback()`` at every scrape."""
+        self._gauges.append((name, help_text, metric_type, callback))
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+
+        lines = []
+        self._render_histograms(
+            lines, "span_duration_seconds", "Duration of timed operations by span, funnel step and outcome.",
+            self._histograms, ("span", "step", "outcome"),
+        )
+        self._render_histograms(
+            lines, "outbound_queue_seconds", "Time outbound calls waited for a rate-limit token by service, funnel step and priority class.",
+            self._queue_histograms, ("service", "step", "priority"),
+        )
+
+        for name, help_text, metric_type, callback in self._gauges:
+            try:
+                value = float(callback())
+            except Exception as e:
+                log.warning("Could not read gauge", gauge=name, error=e)
+                continue
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            lines.append(f"{full_name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def _render_histograms(self, lines, name, help_text, histograms, label_names):
+        family = f"{self.prefix}_{name}"
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} histogram")
+        with self._lock:
+            snapshot = [(key, list(h.counts), h.sum, h.count) for key, h in sorted(histograms.items())]
+
+        for key, counts, total, count in snapshot:
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(label_names, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{family}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{family}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{family}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{family}_count{{{labels}}} {count}")
+
+    async def handle_scrape(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type="text/plain", headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start_server(self, host, port, path="/metrics", routes=()):
+        """
+        Serves the metrics over HTTP; returns the runner to clean up on shutdown.
+        ``routes`` adds (method, path, handler) admin routes to the same server.
+        """
+
+        app = web.Application()
+        app.router.add_get(path, self.handle_scrape)
+        for method, route_path, handler in routes:
+            app.router.add_route(method, route_path, handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        log.info("Serving metrics", address=f"{host}:{port}{path}")
+        return runner
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Shared registry for the whole bot
+metrics = MetricsRegistry()
+span = metrics.span
+step = metrics.step
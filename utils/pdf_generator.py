@@ -1,49 +1,79 @@
+from io import BytesIO
+
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.enums import TA_CENTER
 
-def generate_pdf(text: str, filename: str):
-    """Generates a PDF document with the given text and saves it under the specified filename."""
+# Styles are built once at import time and shared by every document
 
-    # Create a new PDF document with custom margins
-    doc = SimpleDocTemplate(filename, pagesize=letter,
-                            rightMargin=50, leftMargin=50,
-                            topMargin=50, bottomMargin=50)
-
-    # Load default styles
-    styles = getSampleStyleSheet()
-
-    # Define custom normal text style
-    style_normal = ParagraphStyle(
-        name='Normal',
-        parent=styles['Normal'],
-        fontSize=11,
-        leading=15
-    )
-
-    # Define custom heading style 
-    style_heading = ParagraphStyle(
-        name='Heading1',
-        parent=styles['Heading1'],
-        fontSize=18,
-        leading=22,
-        alignment=TA_CENTER,
-        spaceAfter=20
-    )
+# Load default styles
+_styles = getSampleStyleSheet()
+
+# Define custom normal text style
+STYLE_NORMAL = ParagraphStyle(
+    name='Normal',
+    parent=_styles['Normal'],
+    fontSize=11,
+    leading=15
+)
+
+# Define custom heading style
+STYLE_HEADING = ParagraphStyle(
+    name='Heading1',
+    parent=_styles['Heading1'],
+    fontSize=18,
+    leading=22,
+    alignment=TA_CENTER,
+    spaceAfter=20
+)
+
+# Define section heading style for lines such as "<b>1. Policy Summary</b>"
+STYLE_SECTION = ParagraphStyle(
+    name='Section',
+    parent=_styles['Heading2'],
+    fontSize=13,
+    leading=17,
+    spaceBefore=6
+)
+
+TITLE = "Car Insurance Policy Document"
+
+
+def _build_elements(text: str):
+    """Converts policy text into a list of flowables."""
 
     # List to hold all elements of the PDF
     elements = []
 
     # Add centered title
-    elements.append(Paragraph("Car Insurance Policy Document", style_heading))
+    elements.append(Paragraph(TITLE, STYLE_HEADING))
     elements.append(Spacer(1, 12))  # Add vertical space
 
     # Split input text into paragraphs and add them to the document
-    paragraphs = [Paragraph(line, style_normal) for line in text.split('\n') if line.strip()]
-    for p in paragraphs:
-        elements.append(p)
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        is_section = line.startswith("<b>") and line.endswith("</b>")
+        elements.append(Paragraph(line, STYLE_SECTION if is_section else STYLE_NORMAL))
         elements.append(Spacer(1, 10))  # Add small space after each paragraph
 
+    return elements
+
+
+def render_pdf(text: str) -> bytes:
+    """Renders the given text into a PDF document in memory and returns its bytes."""
+
+    buffer = BytesIO()
+
+    # Create a new PDF document with custom margins
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
+                            rightMargin=50, leftMargin=50,
+                            topMargin=50, bottomMargin=50,
+                            title=TITLE)
+
     # Build the PDF with all elements
-    doc.build(elements)
\ No newline at end of file
+    doc.build(_build_elements(text))
+    return buffer.getvalue()
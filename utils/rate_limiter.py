@@ -0,0 +1,217 @@
+# utils/rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import config
+from utils.logger import get_logger
+from utils.metrics import metrics
+
+log = get_logger("Rate Limiter")
+
+# Priority classes, most urgent first
+PRIORITIES = {"interactive": 0, "background": 1}
+
+# Priority class of outbound calls made by the current task
+_current_priority = ContextVar("outbound_priority", default="interactive")
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per second up to ``burst``; a call spends one token."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now):
+        """Spends a token if one is available."""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def reserve(self, now):
+        """Spends a token, going into debt if necessary; returns the seconds to wait before using it."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def wait_time(self, now):
+        """Seconds until the next token is available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def pause(self, seconds, now):
+        """Withholds tokens for ``seconds``, e.g. after the upstream answered 429."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _ServiceLimiter:
+    """Global bucket of one service with a priority queue of waiting calls, plus optional per-chat buckets."""
+
+    def __init__(self, name, rate, burst, chat_rate=None, chat_burst=None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chats = {}
+        self.waiters = []  # heap of (priority, sequence, future)
+        self.sequence = itertools.count()
+        self.pump = None
+
+    def chat_bucket(self, chat_id, now):
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            # Drop buckets of chats that have been quiet long enough to be full again
+            if len(self.chats) >= 1000:
+                self.chats = {key: b for key, b in self.chats.items() if not b.is_idle(now)}
+            bucket = self.chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _pump(self):
+        """Hands out tokens to waiting calls in priority order as the bucket refills."""
+        while self.waiters:
+            now = time.monotonic()
+            if self.bucket.try_take(now):
+                _, _, future = heapq.heappop(self.waiters)
+                if future.done():
+                    self.bucket.tokens += 1  # Caller gave up; keep its token
+                else:
+                    future.set_result(None)
+                continue
+            await asyncio.sleep(self.bucket.wait_time(now))
+
+    async def acquire(self, priority):
+        if not self.waiters and self.bucket.try_take(time.monotonic()):
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (PRIORITIES[priority], next(self.sequence), future))
+        if self.pump is None or self.pump.done():
+            self.pump = asyncio.create_task(self._pump())
+        await future
+
+
+class OutboundScheduler:
+    """
+    Central rate limiting for calls to Telegram, Mindee and OpenAI.
+
+    Each service has a global token bucket; Telegram also has one bucket per
+    chat. When a service's bucket is empty, waiting calls are granted tokens
+    in priority order ("interactive" before "background"), first come first
+    served within a class. The time each call waits is recorded per service
+    and priority class (metrics.observe_queue).
+    """
+
+    def __init__(self):
+        self._services = {}
+
+    def configure(self, service, rate, burst, chat_rate=None, chat_burst=None):
+        """Sets the limits of a service; a rate of 0 leaves it unlimited."""
+        if rate:
+            self._services[service] = _ServiceLimiter(service, rate, burst, chat_rate, chat_burst)
+        else:
+            self._services.pop(service, None)
+
+    @contextmanager
+    def priority(self, name):
+        """Runs the enclosed calls (and tasks started in it) in the given priority class."""
+        if name not in PRIORITIES:
+            raise ValueError(f"Unknown priority class: {name}")
+        token = _current_priority.set(name)
+        try:
+            yield
+        finally:
+            _current_priority.reset(token)
+
+    async def acquire(self, service, chat_id=None, priority=None):
+        """Waits until a call to ``service`` (for ``chat_id``, if given) may go out."""
+
+        limiter = self._services.get(service)
+        if limiter is None:
+            return
+
+        priority = priority or _current_priority.get()
+        started = time.monotonic()
+
+        # The chat's own limit first, so one busy chat cannot hold up the global queue
+        if chat_id is not None and limiter.chat_rate:
+            delay = limiter.chat_bucket(chat_id, started).reserve(started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        await limiter.acquire(priority)
+        metrics.observe_queue(service, time.monotonic() - started, metrics.current_step(), priority)
+
+    def pause(self, service, seconds, chat_id=None):
+        """Holds back calls after the service asked to slow down (HTTP 429)."""
+        limiter = self._services.get(service)
+        if limiter is None:
+            return
+        now = time.monotonic()
+        if chat_id is not None and limiter.chat_rate:
+            limiter.chat_bucket(chat_id, now).pause(seconds, now)
+        else:
+            limiter.bucket.pause(seconds, now)
+        log.warning("Rate limited by upstream", service=service, chat_id=chat_id, seconds=seconds)
+
+    def queued(self, service):
+        """Number of calls waiting for a token of the service's global bucket."""
+        limiter = self._services.get(service)
+        return len(limiter.waiters) if limiter else 0
+
+
+def limit_telegram_requests(scheduler):
+    """
+    Routes every Bot API request made by telebot through the scheduler.
+    getUpdates (long polling) is exempt. A 429 answer pauses the chat's bucket
+    (or the global one) for the time Telegram asks for.
+    """
+
+    from telebot import asyncio_helper
+    from telebot.asyncio_helper import ApiTelegramException
+
+    process_request = asyncio_helper._process_request
+    if getattr(process_request, "rate_limited", False):
+        return
+
+    async def limited_process_request(token, url, method="get", params=None, files=None, **kwargs):
+        if url == "getUpdates":
+            return await process_request(token, url, method, params, files, **kwargs)
+
+        chat_id = params.get("chat_id") if params else None
+        await scheduler.acquire("telegram", chat_id=chat_id)
+        try:
+            return await process_request(token, url, method, params, files, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = (e.result_json.get("parameters") or {}).get("retry_after", 1)
+                scheduler.pause("telegram", retry_after, chat_id=chat_id)
+            raise
+
+    limited_process_request.rate_limited = True
+    asyncio_helper._process_request = limited_process_request
+
+
+# Shared scheduler for all outbound calls
+outbound = OutboundScheduler()
+outbound.configure("telegram", config.TELEGRAM_RATE, config.TELEGRAM_BURST, config.TELEGRAM_CHAT_RATE, config.TELEGRAM_CHAT_BURST)
+outbound.configure("mindee", config.MINDEE_RATE, config.MINDEE_BURST)
+outbound.configure("openai", config.OPENAI_RATE, config.OPENAI_BURST)
@@ -0,0 +1,99 @@
+# utils/session.py
+
+import sys
+import time
+
+
+class Session:
+    """
+    Compact record of one user's conversation.
+
+    Holds only the fields the insurance flow uses, as flat slots instead of
+    nested dictionaries. ``user_data()`` rebuilds the dictionary shape the
+    handlers and policy generator expect.
+    """
+
+    PASSPORT_FIELDS = ("surname", "given_names", "birth_date")
+    VEHICLE_FIELDS = ("license_plate", "vin", "make", "model")
+
+    __slots__ = ("state", "confirmed", "last_seen", "vehicle_confidence") + PASSPORT_FIELDS + VEHICLE_FIELDS
+
+    def __init__(self, state=None):
+        self.state = state
+        self.confirmed = False
+        self.last_seen = time.time()
+        self.vehicle_confidence = None  # Per-field OCR confidences of the vehicle fields
+        for field in self.PASSPORT_FIELDS + self.VEHICLE_FIELDS:
+            setattr(self, field, None)
+
+    def touch(self):
+        """Marks the session as active now."""
+        self.last_seen = time.time()
+
+    def has_passport(self):
+        return self.surname is not None
+
+    def has_vehicle(self):
+        return any(getattr(self, field) is not None for field in self.VEHICLE_FIELDS)
+
+    def user_data(self):
+        """Returns the collected data as {"passport": {...}, "vehicle": {...}, "confirmed": ...}."""
+        data = {}
+        if self.has_passport():
+            data["passport"] = {
+                "surname": self.surname,
+                "given_names": list(self.given_names or ()),
+                "birth_date": self.birth_date,
+            }
+        if self.has_vehicle():
+            data["vehicle"] = {
+                field: getattr(self, field)
+                for field in self.VEHICLE_FIELDS
+                if getattr(self, field) is not None
+            }
+            if self.vehicle_confidence:
+                data["vehicle"]["confidence"] = dict(self.vehicle_confidence)
+        if data:
+            data["confirmed"] = self.confirmed
+        return data
+
+    def set_user_data(self, key, value):
+        """Stores one item of collected data ("passport", "vehicle" or "confirmed")."""
+        if key == "passport":
+            self.surname = value.get("surname")
+            self.given_names = tuple(value.get("given_names") or ())
+            self.birth_date = value.get("birth_date")
+        elif key == "vehicle":
+            for field in self.VEHICLE_FIELDS:
+                setattr(self, field, value.get(field))
+            self.vehicle_confidence = value.get("confidence") or None
+        elif key == "confirmed":
+            self.confirmed = bool(value)
+        else:
+            raise KeyError(f"Unknown session field: {key}")
+
+    def is_empty(self):
+        return self.state is None and not self.has_passport() and not self.has_vehicle()
+
+    def size_estimate(self):
+        """Approximate memory footprint of the record in bytes."""
+        size = sys.getsizeof(self)
+        for field in self.__slots__:
+            value = getattr(self, field)
+            size += sys.getsizeof(value) if value is not None else 0
+            if isinstance(value, tuple):
+                size += sum(sys.getsizeof(item) for item in value)
+        return size
+
+    def to_dict(self):
+        """Serializes the session for a persistent backend."""
+        return {"state": self.state, "user_data": self.user_data(), "last_seen": self.last_seen}
+
+    @classmethod
+    def from_dict(cls, record):
+        """Restores a session from a persistent backend record."""
+        session = cls(record.get("state"))
+        for key, value in record.get("user_data", {}).items():
+            session.set_user_data(key, value)
+        session.last_seen = record.get("last_seen", session.last_seen)
+        return session
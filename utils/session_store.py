@@ -0,0 +1,107 @@
+# utils/session_store.py
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class MemorySessionStore:
+    """
+    Process-local session backend. Sessions are lost on restart.
+    Records are kept as the live Session objects, without serialization.
+    """
+
+    persistent = False
+
+    def __init__(self):
+        self._records = {}
+        # Records are changed on the event loop and swept by the maintenance thread
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        """Returns the stored record for a user, or None."""
+        with self._lock:
+            return self._records.get(user_id)
+
+    def save_many(self, records):
+        """Stores a batch of {user_id: record}; a None record deletes the session."""
+        with self._lock:
+            for user_id, record in records.items():
+                if record is None:
+                    self._records.pop(user_id, None)
+                else:
+                    self._records[user_id] = record
+
+    def delete_idle(self, cutoff):
+        """Deletes sessions last seen before the cutoff timestamp."""
+        with self._lock:
+            for user_id in [uid for uid, record in self._records.items() if record.last_seen < cutoff]:
+                del self._records[user_id]
+
+    def close(self):
+        pass
+
+
+class SqliteSessionStore:
+    """
+    SQLite session backend in WAL mode.
+
+    WAL lets several worker processes read the same database while one of
+    them writes, so conversations survive restarts and can be shared.
+    Records are stored as JSON text.
+    """
+
+    persistent = True
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load(self, user_id):
+        """Returns the stored record for a user, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, records):
+        """Stores a batch of {user_id: record} in one transaction; a None record deletes the session."""
+        now = time.time()
+        upserts = [(user_id, json.dumps(record, ensure_ascii=False), now) for user_id, record in records.items() if record is not None]
+        deletes = [(user_id,) for user_id, record in records.items() if record is None]
+
+        with self._lock, self._conn:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    upserts,
+                )
+            if deletes:
+                self._conn.executemany("DELETE FROM sessions WHERE user_id = ?", deletes)
+
+    def delete_idle(self, cutoff):
+        """Deletes sessions not updated since the cutoff timestamp."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store(backend, path=None):
+    """Builds a session backend by name ("memory" or "sqlite")."""
+    if backend == "sqlite":
+        return SqliteSessionStore(path)
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session backend: {backend}")
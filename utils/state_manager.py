@@ -1,17 +1,241 @@
 # utils/state_manager.py
 
-# Dictionary to keep track of user states 
-USER_STATE = {}
+import asyncio
+import threading
+import time
+
+import config
+from utils.session import Session
+from utils.logger import get_logger
+from utils.session_store import create_session_store
+
+log = get_logger("Session Store")
+
+
+class SessionManager:
+    """
+    Read-through, write-behind cache of Session records in front of a session backend.
+
+    Reads are served from memory and loaded from the backend on a miss (or
+    once the cached copy is older than ``cache_ttl``, so several workers
+    sharing one store see each other's updates); preload() does that load
+    in a worker thread before an update is handled. Writes only mark the
+    session dirty; a background maintenance thread flushes dirty sessions to
+    the backend in batches every ``flush_interval`` seconds and evicts
+    sessions idle for longer than ``idle_ttl`` seconds.
+    """
+
+    def __init__(self, store, flush_interval=1.0, cache_ttl=None, idle_ttl=None, sweep_interval=60.0):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+
+        self._cache = {}      # user_id -> (Session, loaded_at)
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._last_sweep = time.monotonic()
+
+        # Number of sessions evicted by the sweeper since startup
+        self.evicted = 0
+
+        self._maintenance = threading.Thread(target=self._maintenance_loop, name="session-maintenance", daemon=True)
+        self._maintenance.start()
+
+    def _needs_load(self, user_id):
+        """True if the user's session is not cached, or the cached copy is stale. Call with the lock held."""
+        cached = self._cache.get(user_id)
+        return cached is None or (
+            self.cache_ttl is not None
+            and self.store.persistent
+            and user_id not in self._dirty
+            and time.monotonic() - cached[1] > self.cache_ttl
+        )
+
+    def _cache_record(self, user_id, record):
+        session = record if isinstance(record, Session) else Session.from_dict(record)
+        cached = self._cache[user_id] = (session, time.monotonic())
+        return cached
+
+    def session(self, user_id, create=False):
+        """
+        Returns the user's Session (creating an empty one if requested), or None.
+        A miss is loaded from the backend on the calling thread; on the event
+        loop, preload() the session first so this is served from memory.
+        """
+        with self._lock:
+            if self._needs_load(user_id):
+                record = self.store.load(user_id)
+                if record is None:
+                    if not create:
+                        self._cache.pop(user_id, None)
+                        return None
+                    record = Session()
+                cached = self._cache_record(user_id, record)
+            else:
+                cached = self._cache[user_id]
+
+            cached[0].touch()
+            return cached[0]
+
+    async def preload(self, user_id):
+        """
+        Loads the user's session from a persistent backend in a worker thread
+        if the cached copy is missing or stale, so that the synchronous
+        accessors used by the handlers do not query the backend on the event
+        loop. Users without a stored session are still looked up by session().
+        """
+
+        if not self.store.persistent:
+            return
+        with self._lock:
+            if not self._needs_load(user_id):
+                return
+        record = await asyncio.to_thread(self.store.load, user_id)
+        with self._lock:
+            # Keep whatever a concurrent load or write put in the cache meanwhile
+            if record is not None and self._needs_load(user_id):
+                self._cache_record(user_id, record)
+
+    def mark_dirty(self, user_id):
+        """Schedules the user's session to be written to the backend."""
+        with self._lock:
+            if self.store.persistent:
+                self._dirty.add(user_id)
+            else:
+                # In-memory backend: the cached Session is the stored record
+                self.store.save_many({user_id: self._cache[user_id][0]})
+
+    def flush(self):
+        """Writes all dirty sessions to the backend in one batch."""
+        with self._lock:
+            if not self._dirty:
+                return
+            batch = {}
+            for user_id in self._dirty:
+                cached = self._cache.get(user_id)
+                batch[user_id] = cached[0].to_dict() if cached and not cached[0].is_empty() else None
+            self._dirty.clear()
+
+        try:
+            self.store.save_many(batch)
+        except Exception as e:
+            log.warning("Flush failed, will retry", error=e)
+            with self._lock:
+                self._dirty.update(batch.keys())
+
+    def sweep(self):
+        """Evicts sessions idle for longer than idle_ttl from memory and from the backend."""
+        if self.idle_ttl is None:
+            return
+
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            idle = [user_id for user_id, (session, _) in self._cache.items() if session.last_seen < cutoff]
+            for user_id in idle:
+                del self._cache[user_id]
+                self._dirty.discard(user_id)
+            self.evicted += len(idle)
+
+        # Outside the lock: a SQLite delete can wait on another worker's write lock
+        try:
+            self.store.delete_idle(cutoff)
+        except Exception as e:
+            log.warning("Sweep failed", error=e)
+
+        if idle:
+            log.info("Evicted idle sessions", evicted=len(idle), live=len(self._cache))
+
+    def stats(self):
+        """Returns the number of live sessions and an estimate of their memory use in bytes."""
+        with self._lock:
+            sessions = [session for session, _ in self._cache.values()]
+        return {
+            "sessions": len(sessions),
+            "bytes": sum(session.size_estimate() for session in sessions),
+            "evicted": self.evicted,
+        }
+
+    def _maintenance_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                self.sweep()
+
+    def close(self):
+        """Stops the maintenance thread, writes pending changes and closes the backend."""
+        self._stop.set()
+        self._maintenance.join()
+        self.flush()
+        self.store.close()
+
+
+# Shared session manager configured from the environment, created on first use so that
+# processes which merely import this module (e.g. PDF workers) open no store and start no thread
+_sessions = None
+_sessions_lock = threading.Lock()
+
+
+def _manager():
+    global _sessions
+    if _sessions is None:
+        with _sessions_lock:
+            if _sessions is None:
+                _sessions = SessionManager(
+                    create_session_store(config.SESSION_BACKEND, config.SESSION_DB_PATH),
+                    flush_interval=config.SESSION_FLUSH_INTERVAL,
+                    cache_ttl=config.SESSION_CACHE_TTL,
+                    idle_ttl=config.SESSION_IDLE_TTL,
+                    sweep_interval=config.SESSION_SWEEP_INTERVAL,
+                )
+    return _sessions
+
 
 def set_state(user_id, state):
     """Sets the state for a specific user."""
-    USER_STATE[user_id] = state
+    sessions = _manager()
+    with sessions._lock:
+        sessions.session(user_id, create=True).state = state
+        sessions.mark_dirty(user_id)
 
 def get_state(user_id):
     """Gets the current state of a user. Returns None if no state is set."""
-    return USER_STATE.get(user_id)
+    session = _manager().session(user_id)
+    return session.state if session else None
 
 def clear_state(user_id):
     """Clears (removes) the state for a specific user."""
-    if user_id in USER_STATE:
-        del USER_STATE[user_id]
\ No newline at end of file
+    sessions = _manager()
+    with sessions._lock:
+        session = sessions.session(user_id)
+        if session is not None and session.state is not None:
+            session.state = None
+            sessions.mark_dirty(user_id)
+
+def get_user_data(user_id):
+    """Returns a copy of the collected data (passport, vehicle, ...) of a user."""
+    session = _manager().session(user_id)
+    return session.user_data() if session else {}
+
+def set_user_data(user_id, key, value):
+    """Stores one item of collected data ("passport", "vehicle" or "confirmed") for a user."""
+    sessions = _manager()
+    with sessions._lock:
+        sessions.session(user_id, create=True).set_user_data(key, value)
+        sessions.mark_dirty(user_id)
+
+async def preload_session(user_id):
+    """Loads a user's session off the event loop ahead of the synchronous accessors."""
+    await _manager().preload(user_id)
+
+def session_stats():
+    """Returns the live session count and estimated size in bytes."""
+    return _manager().stats()
+
+def close_sessions():
+    """Flushes pending session changes and closes the backend."""
+    if _sessions is not None:
+        _sessions.close()
@@ -0,0 +1,56 @@
+# utils/streaming.py
+
+import time
+
+from telebot.async_telebot import AsyncTeleBot
+
+import config
+from utils.metrics import metrics
+from utils.rate_limiter import outbound
+
+
+async def send_streamed_message(bot: AsyncTeleBot, chat_id, pieces, reply_markup=None, min_interval=None, min_growth=None):
+    """
+    Shows a streamed reply as one Telegram message that grows as text arrives.
+
+    The message is sent with the first piece of text and then edited at most
+    once every ``min_interval`` seconds (and only after ``min_growth`` new
+    characters), which keeps well within Telegram's per-chat edit limits.
+    A final edit shows the complete text and attaches ``reply_markup``.
+
+    :param pieces: Async iterator of text fragments
+    :return: The complete text
+    """
+
+    min_interval = config.STREAM_EDIT_INTERVAL if min_interval is None else min_interval
+    min_growth = config.STREAM_MIN_GROWTH if min_growth is None else min_growth
+
+    started = time.perf_counter()
+    text = ""
+    shown = ""
+    message = None
+    last_update = 0.0
+
+    async for piece in pieces:
+        text += piece
+        if not text.strip():
+            continue
+
+        now = time.perf_counter()
+        if message is None:
+            message = await bot.send_message(chat_id, text)
+            metrics.observe("stream_first_text", time.perf_counter() - started, metrics.current_step())
+            shown, last_update = text, now
+        elif now - last_update >= min_interval and len(text) - len(shown) >= min_growth:
+            # Intermediate edits are cosmetic, so they give way to other chats' replies
+            with outbound.priority("background"):
+                await bot.edit_message_text(text, chat_id=chat_id, message_id=message.message_id)
+            shown, last_update = text, now
+
+    if message is None:
+        raise ValueError("Empty streamed reply")
+
+    if text != shown or reply_markup is not None:
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message.message_id, reply_markup=reply_markup)
+
+    return text
@@ -0,0 +1,131 @@
+# utils/vin.py
+
+from datetime import date
+
+# Letter values used by the ISO 3779 / FMVSS 565 check digit
+_TRANSLITERATION = {
+    **{str(digit): digit for digit in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+
+# Position weights for the check digit (position 9 has weight 0)
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Model year codes (position 10), repeating every 30 years from 1980
+_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+
+# OCR confusions: I, O and Q are never used in a VIN
+_OCR_FIXES = str.maketrans({"I": "1", "O": "0", "Q": "0"})
+
+# First characters of WMIs from regions where the check digit is mandatory (North America, China)
+_CHECK_DIGIT_REGIONS = set("12345L")
+
+# World Manufacturer Identifiers (3 characters, or 2 where the whole prefix belongs to one make)
+WMI_MAKES = {
+    # United States / Canada / Mexico
+    "1B": "Dodge", "1C": "Chrysler", "1FA": "Ford", "1FB": "Ford", "1FC": "Ford", "1FD": "Ford",
+    "1FM": "Ford", "1FT": "Ford", "1FU": "Freightliner", "1G1": "Chevrolet", "1G2": "Pontiac",
+    "1G3": "Oldsmobile", "1G4": "Buick", "1G6": "Cadillac", "1G8": "Saturn", "1GC": "Chevrolet",
+    "1GM": "Pontiac", "1GT": "GMC", "1GY": "Cadillac", "1HG": "Honda", "1HD": "Harley-Davidson",
+    "1J": "Jeep", "1L": "Lincoln", "1ME": "Mercury", "1N": "Nissan", "1VW": "Volkswagen",
+    "1YV": "Mazda", "1ZV": "Ford", "19U": "Acura", "19X": "Honda", "2C": "Chrysler",
+    "2FA": "Ford", "2FM": "Ford", "2FT": "Ford", "2G1": "Chevrolet", "2G2": "Pontiac",
+    "2GT": "GMC", "2HG": "Honda", "2HK": "Honda", "2HM": "Hyundai", "2T": "Toyota",
+    "3FA": "Ford", "3G": "Chevrolet", "3HG": "Honda", "3N": "Nissan", "3VW": "Volkswagen",
+    "4F": "Mazda", "4S3": "Subaru", "4S4": "Subaru", "4T": "Toyota", "4US": "BMW",
+    "5FN": "Honda", "5J6": "Honda", "5L": "Lincoln", "5N1": "Nissan", "5NP": "Hyundai",
+    "5T": "Toyota", "5UX": "BMW", "5YJ": "Tesla", "5XY": "Kia", "58A": "Lexus",
+    # Japan
+    "JA": "Isuzu", "JF": "Subaru", "JH": "Honda", "JHM": "Honda", "JK": "Kawasaki",
+    "JM": "Mazda", "JN": "Nissan", "JS": "Suzuki", "JT": "Toyota", "JTH": "Lexus",
+    "JTJ": "Lexus", "JY": "Yamaha", "JA3": "Mitsubishi", "JA4": "Mitsubishi", "JMB": "Mitsubishi",
+    # South Korea
+    "KL": "Daewoo", "KMH": "Hyundai", "KNA": "Kia", "KNB": "Kia", "KNC": "Kia", "KND": "Kia",
+    "KNM": "Renault Samsung", "KPT": "SsangYong",
+    # China
+    "LFV": "Volkswagen", "LGB": "Dongfeng", "LGW": "Great Wall", "LRW": "Tesla",
+    "LSV": "Volkswagen", "LVS": "Ford", "LVV": "Chery", "LYV": "Volvo", "LB3": "Geely",
+    # Europe
+    "SAJ": "Jaguar", "SAL": "Land Rover", "SAR": "Rover", "SCC": "Lotus", "SCE": "DeLorean",
+    "SCF": "Aston Martin", "SFD": "Alexander Dennis", "SHH": "Honda", "SHS": "Honda",
+    "SJN": "Nissan", "TMA": "Hyundai", "TMB": "Skoda", "TRU": "Audi", "TSM": "Suzuki",
+    "UU": "Dacia", "VF1": "Renault", "VF3": "Peugeot", "VF6": "Renault Trucks", "VF7": "Citroen",
+    "VF8": "Matra", "VNK": "Toyota", "VR3": "Peugeot", "VSS": "SEAT", "VWV": "Volkswagen",
+    "W0L": "Opel", "W0V": "Opel", "WAU": "Audi", "WA1": "Audi", "WBA": "BMW", "WBS": "BMW M",
+    "WBX": "BMW", "WDB": "Mercedes-Benz", "WDC": "Mercedes-Benz", "WDD": "Mercedes-Benz",
+    "WF0": "Ford", "WMA": "MAN", "WME": "Smart", "WMW": "MINI", "WP0": "Porsche",
+    "WP1": "Porsche", "W1K": "Mercedes-Benz", "W1N": "Mercedes-Benz", "WVG": "Volkswagen",
+    "WVW": "Volkswagen", "WV1": "Volkswagen", "WV2": "Volkswagen", "XTA": "Lada",
+    "XW8": "Volkswagen", "YK1": "Saab", "YS3": "Saab", "YV1": "Volvo", "YV4": "Volvo",
+    "ZAM": "Maserati", "ZAR": "Alfa Romeo", "ZCF": "Iveco", "ZFA": "Fiat", "ZFF": "Ferrari",
+    "ZHW": "Lamborghini", "ZLA": "Lancia", "Y6D": "ZAZ", "Y7A": "KrAZ",
+}
+
+# Precomputed index: 3-character WMIs and 2-character prefixes in separate dicts for O(1) lookups
+_WMI3 = {wmi: make for wmi, make in WMI_MAKES.items() if len(wmi) == 3}
+_WMI2 = {wmi: make for wmi, make in WMI_MAKES.items() if len(wmi) == 2}
+
+
+def normalize_vin(vin):
+    """Uppercases a VIN, removes separators and fixes I/O/Q OCR confusions."""
+    if not vin:
+        return ""
+    return "".join(ch for ch in str(vin).upper() if ch.isalnum()).translate(_OCR_FIXES)
+
+
+def check_digit(vin):
+    """Computes the expected check digit ("0"-"9" or "X") for a 17-character VIN."""
+    total = sum(_TRANSLITERATION[ch] * weight for ch, weight in zip(vin, _WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def is_valid_vin(vin):
+    """
+    Validates a normalized VIN: 17 characters from the VIN alphabet, and a correct
+    check digit where the manufacturing region requires one.
+    """
+    if len(vin) != 17 or any(ch not in _TRANSLITERATION for ch in vin):
+        return False
+    if vin[0] in _CHECK_DIGIT_REGIONS:
+        return vin[8] == check_digit(vin)
+    return True
+
+
+def model_year(vin, today=None):
+    """
+    Decodes the model year from position 10.
+    Position 7 disambiguates the 30-year cycle for North American VINs; otherwise
+    the latest year not more than one year in the future is used.
+    """
+    code = vin[9]
+    if code not in _YEAR_CODES:
+        return None
+
+    base = 1980 + _YEAR_CODES.index(code)
+    if vin[0] in "12345":
+        return base + 30 if vin[6].isalpha() else base
+
+    latest = (today or date.today()).year + 1
+    while base + 30 <= latest:
+        base += 30
+    return base
+
+
+def make_from_wmi(vin):
+    """Looks up the manufacturer for the VIN's World Manufacturer Identifier."""
+    return _WMI3.get(vin[:3]) or _WMI2.get(vin[:2])
+
+
+def decode_vin(vin):
+    """
+    Normalizes, validates and decodes a VIN.
+
+    :return: Dictionary with vin, valid, make (or None) and year (or None)
+    """
+    vin = normalize_vin(vin)
+    if not is_valid_vin(vin):
+        return {"vin": vin, "valid": False, "make": None, "year": None}
+    return {"vin": vin, "valid": True, "make": make_from_wmi(vin), "year": model_year(vin)}
@@ -0,0 +1,72 @@
+# utils/webhook_server.py
+
+import hmac
+
+from aiohttp import web
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from utils.dispatcher import UserDispatcher
+from utils.logger import get_logger
+
+log = get_logger("Webhook")
+
+
+class WebhookServer:
+    """
+    Receives Telegram updates over HTTPS webhooks with a local aiohttp server.
+
+    Each request is checked against the secret token, parsed, handed to the
+    bot (whose per-user dispatcher queues it) and acknowledged immediately.
+    While the dispatcher is full, updates are refused with 503 so that
+    Telegram delivers them again later (back-pressure).
+    """
+
+    def __init__(self, bot: AsyncTeleBot, dispatcher: UserDispatcher, secret_token, path="/webhook"):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.secret_token = secret_token
+        self.path = path
+
+        self._runner = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Validates, enqueues and acknowledges one update."""
+
+        received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not self.secret_token or not hmac.compare_digest(received, self.secret_token):
+            return web.Response(status=403)
+
+        if self.dispatcher.full:
+            # Telegram retries non-2xx responses, which applies back-pressure
+            log.warning("Dispatcher is full", queued=self.dispatcher.stats()["queue_depth"])
+            return web.Response(status=503)
+
+        try:
+            update = types.Update.de_json(await request.text())
+        except Exception as e:
+            log.warning("Invalid update", error=e)
+            return web.Response(status=400)
+
+        await self.bot.process_new_updates([update])
+        return web.Response()
+
+    async def start(self, host, port, webhook_url):
+        """Starts the HTTP server and registers the webhook with Telegram."""
+
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+        await self.bot.set_webhook(url=webhook_url, secret_token=self.secret_token)
+        log.info("Listening", address=f"{host}:{port}{self.path}")
+
+    async def stop(self):
+        """Stops accepting updates."""
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None